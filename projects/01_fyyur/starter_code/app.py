@@ -6,19 +6,39 @@ from crypt import methods
 from dataclasses import dataclass
 from enum import unique
 import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+import base64
+from itertools import groupby
+from collections import Counter
 from unicodedata import name
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
+from werkzeug.datastructures import MultiDict
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, array
 import logging
-from logging import Formatter, FileHandler
+from logging import Formatter, FileHandler, StreamHandler
 from flask_wtf import Form
 from forms import *
 from config import *
 from flask_migrate import Migrate
+import search
+import catalog_io
+import click
+from flask.cli import AppGroup
+from cache import PageCache, backend_from_config, conditional
+from telemetry import PoolMetrics, MeteredQueuePool, QueryStats
+from writes import WritePipeline
+from purge import PurgeJob, PurgeQueue
+import atexit
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError, DataError
+from sqlalchemy.orm import with_loader_criteria
+import jsonstream
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -26,22 +46,91 @@ from flask_migrate import Migrate
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+pool_metrics = PoolMetrics()
+
+slow_query_log = logging.getLogger('fyyur.slow_queries')
+if app.config['SLOW_QUERY_LOG']:
+  slow_query_handler = FileHandler(app.config['SLOW_QUERY_LOG'], delay=True)
+else:
+  slow_query_handler = StreamHandler()
+slow_query_handler.setFormatter(Formatter('%(asctime)s %(message)s'))
+slow_query_log.addHandler(slow_query_handler)
+slow_query_log.setLevel(logging.WARNING)
+query_stats = QueryStats(slow_query_log, app.config['SLOW_QUERY_THRESHOLD_MS'])
+
+class MeteredSQLAlchemy(SQLAlchemy):
+  """SQLAlchemy whose engine reports to ``pool_metrics`` and ``query_stats``.
+
+  SQLite engines do not take pool sizing options, so those are dropped there.
+  """
+  def create_engine(self, sa_url, engine_opts):
+    if sa_url.drivername.startswith('sqlite'):
+      for option in ('pool_size', 'max_overflow', 'pool_timeout'):
+        engine_opts.pop(option, None)
+    else:
+      engine_opts.setdefault('poolclass', MeteredQueuePool)
+    engine = super().create_engine(sa_url, engine_opts)
+    engine.pool.metrics = pool_metrics
+    pool_metrics.watch(engine.pool)
+    query_stats.watch(engine)
+    return engine
+
+db = MeteredSQLAlchemy(app)
 
 
 app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
 migrate = Migrate(app, db)
+page_cache = PageCache(backend_from_config(app.config), ttl=app.config['CACHE_TTL'])
+write_pipeline = WritePipeline(app, db, on_commit=lambda groups: page_cache.invalidate(*groups),
+  batch_size=app.config['WRITE_BATCH_SIZE'], max_wait=app.config['WRITE_BATCH_WAIT_MS'] / 1000)
+atexit.register(write_pipeline.close)
+purge_queue = PurgeQueue(app, db, batch_size=app.config['PURGE_BATCH_SIZE'], pause=app.config['PURGE_PAUSE_MS'] / 1000)
+atexit.register(purge_queue.close)
+
+@app.after_request
+def report_query_stats(response):
+  # Every request logs what it cost the database; debug responses carry it too.
+  stats = QueryStats.current()
+  if stats['count']:
+    app.logger.info('%s %s: %s', request.method, request.path, QueryStats.summary(stats))
+  if app.debug:
+    response.headers['X-DB-Queries'] = str(stats['count'])
+    response.headers['X-DB-Time-Ms'] = '%.1f' % stats['time_ms']
+    response.headers['X-DB-Slowest'] = QueryStats.summary(stats).encode('ascii', 'replace').decode()
+  return response
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+DEFAULT_SHOW_MINUTES = 120
+# Overlap lookups only scan shows that started at most this long before the
+# window, so no show may run longer.
+MAX_SHOW_MINUTES = 720
+
+def show_end_date(context):
+  params = context.get_current_parameters()
+  return params['start_date'] + timedelta(minutes=params.get('duration_minutes') or DEFAULT_SHOW_MINUTES)
+
 class Show(db.Model):
   __tablename__ ='show'
 
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer,db.ForeignKey('artist.id'), nullable=False)
   venue_id = db.Column(db.Integer,db.ForeignKey('venue.id'), nullable=False)
-  start_date = db.Column(db.DateTime(), nullable=False, unique=True)
+  start_date = db.Column(db.DateTime(), nullable=False)
+  duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+    server_default=str(DEFAULT_SHOW_MINUTES))
+  end_date = db.Column(db.DateTime(), nullable=False, default=show_end_date)
+  updated_at = db.Column(db.DateTime(), nullable=False, default=datetime.today, onupdate=datetime.today, index=True)
+
+  # On Postgres the migrations add exclusion constraints on top, so no venue
+  # or artist can hold two overlapping shows whichever way they are written.
+  __table_args__ = (
+    db.UniqueConstraint('venue_id', 'start_date', name='uq_show_venue_slot'),
+    db.CheckConstraint('duration_minutes BETWEEN 1 AND %d' % MAX_SHOW_MINUTES, name='ck_show_duration'),
+    db.Index('ix_show_artist_id_start_date', 'artist_id', 'start_date'),
+    db.Index('ix_show_start_date_id', 'start_date', 'id'),
+  )
 
 class Venue(db.Model):
     __tablename__ = 'venue'
@@ -58,8 +147,17 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talents = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime(), nullable=False, default=datetime.today, onupdate=datetime.today, index=True)
+    # Set when deleted; the row is hidden until the purge queue removes it.
+    deleted_at = db.Column(db.DateTime(), index=True)
     shows = db.relationship('Show', cascade='all, delete-orphan', backref='venue', lazy=True)
 
+    __table_args__ = (
+      db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_venue_state_city_name', 'state', 'city', 'name'),
+    )
+
     
 class Artist(db.Model):
     __tablename__ = 'artist'
@@ -75,23 +173,736 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_venue_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime(), nullable=False, default=datetime.today, onupdate=datetime.today, index=True)
+    # Set when deleted; the row is hidden until the purge queue removes it.
+    deleted_at = db.Column(db.DateTime(), index=True)
     shows = db.relationship('Show', cascade='all, delete-orphan', backref='artist', lazy=True)
 
+    __table_args__ = (
+      db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_artist_state_city_name', 'state', 'city', 'name'),
+    )
+
+
+# Name prefixes (search, suggestions) are looked up and ordered by
+# lower(name) in byte order, which this expression index serves. Postgres
+# only: SQLite has no "C" collation.
+for model in (Venue, Artist):
+  event.listen(model.__table__, 'after_create', db.DDL(
+    'CREATE INDEX ix_%(table)s_name_lower ON %(table)s (lower(name) COLLATE "C")').execute_if(dialect='postgresql'))
+
+# Tables built by create_all() rather than the migrations get the extensions
+# too: the name trigram indexes need pg_trgm, and the overlap constraints
+# the migrations add to shows need btree_gist.
+for table, extension in ((Venue.__table__, 'pg_trgm'), (Artist.__table__, 'pg_trgm'), (Show.__table__, 'btree_gist')):
+  event.listen(table, 'before_create', db.DDL(
+    'CREATE EXTENSION IF NOT EXISTS %s' % extension).execute_if(dialect='postgresql'))
+
+
+class Area(db.Model):
+    """Summary row per (city, state) with venues, kept current by refresh_areas()."""
+    __tablename__ = 'area'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows = db.Column(db.Integer, nullable=False, default=0)
+    # Start of the area's next show: once it has passed, upcoming_shows is stale.
+    stale_after = db.Column(db.DateTime())
+    refreshed_at = db.Column(db.DateTime(), nullable=False)
+
+    __table_args__ = (
+      db.UniqueConstraint('state', 'city', name='uq_area_state_city'),
+    )
+
+
+class AreaGenre(db.Model):
+    """Venues per genre in an area, kept current with the Area rows by refresh_areas()."""
+    __tablename__ = 'area_genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    genre = db.Column(db.String(), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+      db.UniqueConstraint('state', 'city', 'genre', name='uq_area_genre_state_city_genre'),
+    )
+
+# Soft-deleted venues and artists, and the shows they had, are left out of
+# every ORM query unless it runs with execution_options(include_deleted=True).
+# The purge queue removes them for good in the background.
+deleted_venue_ids = db.select(Venue.__table__.c.id).where(Venue.__table__.c.deleted_at.isnot(None))
+deleted_artist_ids = db.select(Artist.__table__.c.id).where(Artist.__table__.c.deleted_at.isnot(None))
+
+@event.listens_for(db.session, 'do_orm_execute')
+def hide_deleted(state):
+  if not state.is_select or state.execution_options.get('include_deleted', False):
+    return
+  state.statement = state.statement.options(
+    with_loader_criteria(Venue, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+    with_loader_criteria(Artist, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+    with_loader_criteria(Show, lambda cls: db.and_(
+      cls.venue_id.notin_(deleted_venue_ids), cls.artist_id.notin_(deleted_artist_ids)), include_aliases=True),
+  )
+
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=64)
+def compiled_datetime_format(format, locale):
+  """Parsed Babel pattern and locale data for a (format, locale) pair."""
+  return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # Views pass datetimes straight from the model; only strings get parsed.
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = compiled_datetime_format(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+DETAIL_SHOWS_PER_PAGE = 30
+SHOWS_PER_PAGE = 30
+VENUES_PER_AREA_PAGE = 20
+
+def venue_areas(now=None, genre=None):
+  """Venues grouped by (city, state) with their upcoming show counts.
+
+  Everything comes back from a single grouped query; the rows are ordered
+  by area so grouping them is a single pass over the result. ``genre``
+  limits the listing to venues tagged with it.
+  """
+  now = now or datetime.today()
+  query = db.session.query(
+      Venue.city, Venue.state, Venue.id, Venue.name, db.func.count(Show.id)
+    ).outerjoin(Show, db.and_(Show.venue_id == Venue.id, Show.start_date > now,
+                              Show.artist_id.notin_(deleted_artist_ids)))
+  if genre:
+    query = with_genre(query, Venue, genre)
+  rows = query.group_by(Venue.id
+    ).order_by(Venue.state, Venue.city, Venue.name
+    ).all()
+
+  return [ dict(city=city, state=state, venues=[
+      dict(id=row[2], name=row[3], upcoming_shows=row[4]) for row in group
+    ]) for (city, state), group in groupby(rows, key=lambda row: (row[0], row[1])) ]
+
+def area_totals(now):
+  """Venue count, upcoming show count and next show per (city, state), unaggregated."""
+  # hide_deleted's criteria do not reach an outer-joined Show (nor in
+  # venue_areas); leave out the shows of deleted artists here.
+  return db.session.query(
+      Venue.city, Venue.state,
+      db.func.count(db.distinct(Venue.id)), db.func.count(Show.id), db.func.min(Show.start_date)
+    ).outerjoin(Show, db.and_(Show.venue_id == Venue.id, Show.start_date > now,
+                              Show.artist_id.notin_(deleted_artist_ids))
+    ).group_by(Venue.state, Venue.city)
+
+def area_genre_totals(areas=None):
+  """``(city, state, genre, venue count)`` for ``areas``, or for every area."""
+  if db.engine.dialect.name == 'postgresql':
+    tags = db.session.query(Venue.city, Venue.state, db.func.unnest(Venue.genres).label('genre'))
+    if areas is not None:
+      tags = tags.filter(db.tuple_(Venue.city, Venue.state).in_(list(areas)))
+    tags = tags.subquery()
+    return db.session.query(tags.c.city, tags.c.state, tags.c.genre, db.func.count()
+      ).group_by(tags.c.state, tags.c.city, tags.c.genre
+      ).all()
+  query = db.session.query(Venue.city, Venue.state, Venue.genres)
+  if areas is not None:
+    query = query.filter(db.tuple_(Venue.city, Venue.state).in_(list(areas)))
+  counts = Counter((city, state, genre) for city, state, genres in query for genre in genres or [])
+  return [ key + (count,) for key, count in counts.items() ]
+
+def refresh_areas(*areas, now=None):
+  """Recompute the Area and AreaGenre rows for the given ``(city, state)`` pairs.
+
+  Runs inside the caller's transaction, after its venue or show changes
+  have been flushed, so the summary commits together with them. An area
+  left without venues loses its rows.
+  """
+  now = now or datetime.today()
+  areas = set(areas)
+  if not areas:
+    return
+  db.session.flush()
+  totals = { (row[0], row[1]): row[2:] for row in area_totals(now).filter(
+    db.tuple_(Venue.city, Venue.state).in_(list(areas))) }
+  existing = { (area.city, area.state): area for area in Area.query.filter(
+    db.tuple_(Area.city, Area.state).in_(list(areas))) }
+  for key in areas:
+    area = existing.get(key)
+    if key not in totals:
+      if area is not None:
+        db.session.delete(area)
+      continue
+    if area is None:
+      area = Area(city=key[0], state=key[1])
+      db.session.add(area)
+    area.venue_count, area.upcoming_shows, area.stale_after = totals[key]
+    area.refreshed_at = now
+  AreaGenre.query.filter(db.tuple_(AreaGenre.city, AreaGenre.state).in_(list(areas))
+    ).delete(synchronize_session=False)
+  db.session.bulk_insert_mappings(AreaGenre, [ dict(city=city, state=state, genre=genre, venue_count=count)
+    for city, state, genre, count in area_genre_totals(areas) ])
+
+def refresh_all_areas(now=None):
+  """Rebuild the whole area index; for bulk loads and `flask areas refresh`."""
+  now = now or datetime.today()
+  Area.query.delete()
+  AreaGenre.query.delete()
+  db.session.bulk_insert_mappings(Area, [ dict(
+    city=city, state=state, venue_count=venue_count, upcoming_shows=upcoming,
+    stale_after=stale_after, refreshed_at=now,
+  ) for city, state, venue_count, upcoming, stale_after in area_totals(now) ])
+  db.session.bulk_insert_mappings(AreaGenre, [ dict(city=city, state=state, genre=genre, venue_count=count)
+    for city, state, genre, count in area_genre_totals() ])
+  db.session.commit()
+
+def area_index(now=None):
+  """Every area with its venue and upcoming show counts, from the area index.
+
+  This reads one row per area however many venues there are. Areas whose
+  next show has started since they were counted are recomputed first;
+  that is rare, and touches only those areas.
+  """
+  now = now or datetime.today()
+  query = Area.query.order_by(Area.state, Area.city)
+  areas = query.all()
+  stale = [ (area.city, area.state) for area in areas if area.stale_after and area.stale_after <= now ]
+  if stale:
+    refresh_areas(*stale, now=now)
+    db.session.commit()
+    areas = query.all()
+  return [ dict(city=area.city, state=area.state, venue_count=area.venue_count,
+                upcoming_shows=area.upcoming_shows) for area in areas ]
+
+def area_venues_page(city, state, page=1, per_page=VENUES_PER_AREA_PAGE):
+  """One page of an area's venues by name, with upcoming show counts.
+
+  Returns ``(venues, has_more)``; the venues come off the (state, city,
+  name) index and their counts from one batched query.
+  """
+  rows = db.session.query(Venue.id, Venue.name
+    ).filter(Venue.state == state, Venue.city == city
+    ).order_by(Venue.name, Venue.id
+    ).offset((page - 1) * per_page
+    ).limit(per_page + 1
+    ).all()
+  has_more = len(rows) > per_page
+  rows = rows[:per_page]
+  upcoming = upcoming_show_counts(Show.venue_id, [ row.id for row in rows ])
+  return [ dict(id=row.id, name=row.name, upcoming_shows=upcoming[row.id]) for row in rows ], has_more
+
+def with_genre(query, model, genre):
+  """Narrow ``query`` to ``model`` rows tagged ``genre``.
+
+  On Postgres this is ``genres @> ARRAY[genre]``, answered by the GIN index
+  on the genres column.
+  """
+  if db.engine.dialect.name == 'postgresql':
+    return query.filter(model.genres.op('@>')(db.cast(array([genre]), ARRAY(db.String))))
+  # Without array operators, pick the matching ids out in Python.
+  ids = [ row.id for row in db.session.query(model.id, model.genres) if genre in (row.genres or []) ]
+  return query.filter(model.id.in_(ids))
+
+def genre_choices():
+  """Form genre choices: the standard ones, then any others the catalog uses."""
+  used = { facet['genre'] for model in (Venue, Artist) for facet in genre_facets(model) }
+  return GENRES + sorted(used - set(GENRES))
+
+choice_registry.register('genres', genre_choices, ttl=app.config['FORM_CHOICES_TTL'])
+
+def genre_facets(model):
+  """``[{'genre': ..., 'count': ...}]`` for ``model``, most used first, in one query.
+
+  Venue counts are summed from the AreaGenre rows, one per area and genre,
+  rather than counted over every venue.
+  """
+  if model is Venue:
+    counts = db.session.query(AreaGenre.genre, db.func.sum(AreaGenre.venue_count)
+      ).group_by(AreaGenre.genre
+      ).all()
+  elif db.engine.dialect.name == 'postgresql':
+    tags = db.session.query(db.func.unnest(model.genres).label('genre')).subquery()
+    counts = db.session.query(tags.c.genre, db.func.count()
+      ).group_by(tags.c.genre
+      ).all()
+  else:
+    counts = Counter(genre for (genres,) in db.session.query(model.genres) for genre in genres or []).items()
+  return [ dict(genre=genre, count=count)
+           for genre, count in sorted(counts, key=lambda facet: (-facet[1], facet[0])) ]
+
+def upcoming_show_counts(column, ids, now=None):
+  """Map each id in ``ids`` to its number of upcoming shows.
+
+  ``column`` is ``Show.venue_id`` or ``Show.artist_id``; the counts for a
+  whole page of ids come from one GROUP BY, ids without shows map to 0.
+  """
+  ids = list(ids)
+  if not ids:
+    return {}
+  now = now or datetime.today()
+  rows = db.session.query(column, db.func.count(Show.id)
+    ).filter(column.in_(ids), Show.start_date > now
+    ).group_by(column
+    ).all()
+  counts = dict.fromkeys(ids, 0)
+  counts.update(rows)
+  return counts
+
+class SchedulingConflict(ValueError):
+  """A show would overlap another one at the same venue or by the same artist."""
+
+def overlapping(start, end):
+  """Shows running at any point in ``[start, end)``.
+
+  The lower bound on start_date keeps this a range scan of the
+  (venue_id, start_date) and (artist_id, start_date) indexes: nothing that
+  started more than MAX_SHOW_MINUTES before ``start`` can still be on.
+  """
+  return db.and_(
+    Show.start_date < end,
+    Show.start_date > start - timedelta(minutes=MAX_SHOW_MINUTES),
+    Show.end_date > start,
+  )
+
+def show_conflicts(venue_id, artist_id, start, end):
+  """Shows that keep ``venue_id`` or ``artist_id`` busy during ``[start, end)``."""
+  return db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_date, Show.end_date
+    ).filter(overlapping(start, end), db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id)
+    ).order_by(Show.start_date
+    ).all()
+
+def check_schedule(venue_id, artist_id, start, end):
+  """Raise SchedulingConflict naming the first booking that overlaps."""
+  for show in show_conflicts(venue_id, artist_id, start, end):
+    who = 'venue %d' % venue_id if show.venue_id == venue_id else 'artist %d' % artist_id
+    raise SchedulingConflict('%s is booked from %s to %s' % (
+      who, show.start_date.strftime('%Y-%m-%d %H:%M'), show.end_date.strftime('%Y-%m-%d %H:%M')))
+
+def free_in_area(model, show_column, city, state, start, end, limit=None):
+  """``model`` rows in (city, state) with no show overlapping ``[start, end)``.
+
+  ``model`` is Venue or Artist and ``show_column`` its Show foreign key.
+  Rows come off the (state, city, name) index and each is checked with one
+  index probe for an overlapping show, so the cost follows the size of the
+  area, not the number of shows scheduled.
+  """
+  busy = db.session.query(Show.id).filter(show_column == model.id, overlapping(start, end))
+  query = db.session.query(model.id, model.name
+    ).filter(model.state == state, model.city == city, ~busy.exists()
+    ).order_by(model.name, model.id)
+  if limit:
+    query = query.limit(limit)
+  return [ dict(id=row.id, name=row.name) for row in query ]
+
+def detail_page_shows(owner_column, owner_id, other, now=None,
+                      upcoming_page=1, past_page=1, per_page=DETAIL_SHOWS_PER_PAGE):
+  """One page each of a venue's or artist's upcoming and past shows.
+
+  ``owner_column`` is the Show column to filter on and ``other`` the model on
+  the other end of the show, whose id, name and image link are joined in.
+  Shows are split on a single ``now``; upcoming ones are numbered soonest
+  first and past ones latest first, so both pages and both totals come back
+  from one windowed query. Returns a dict with ``upcoming``/``past`` rows
+  (``start_date``, ``id``, ``name``, ``image_link``) and their counts.
+  """
+  now = now or datetime.today()
+  other_column = Show.artist_id if other is Artist else Show.venue_id
+  upcoming = Show.start_date > now
+  numbered = db.session.query(
+      Show.start_date.label('start_date'),
+      other.id.label('id'),
+      other.name.label('name'),
+      other.image_link.label('image_link'),
+      upcoming.label('upcoming'),
+      db.func.row_number().over(partition_by=upcoming, order_by=Show.start_date).label('soonest'),
+      db.func.row_number().over(partition_by=upcoming, order_by=Show.start_date.desc()).label('latest'),
+      db.func.sum(db.case((upcoming, 1), else_=0)).over().label('upcoming_count'),
+      db.func.count().over().label('total'),
+    ).join(other, other.id == other_column
+    ).filter(owner_column == owner_id
+    ).subquery()
+
+  def page_bounds(column, page):
+    return db.and_(column > (page - 1) * per_page, column <= page * per_page)
+
+  rows = db.session.query(numbered).filter(db.or_(
+      db.and_(numbered.c.upcoming, page_bounds(numbered.c.soonest, upcoming_page)),
+      db.and_(db.not_(numbered.c.upcoming), page_bounds(numbered.c.latest, past_page)),
+    )).all()
+
+  if rows:
+    upcoming_count, total = rows[0].upcoming_count, rows[0].total
+  elif upcoming_page > 1 or past_page > 1:
+    # Both pages are past the end, so no row carried the totals.
+    upcoming_count, total = db.session.query(
+        db.func.sum(db.case((upcoming, 1), else_=0)), db.func.count(Show.id)
+      ).filter(owner_column == owner_id).one()
+  else:
+    upcoming_count, total = 0, 0
+
+  return dict(
+    upcoming=sorted((row for row in rows if row.upcoming), key=lambda row: row.soonest),
+    past=sorted((row for row in rows if not row.upcoming), key=lambda row: row.latest),
+    upcoming_count=upcoming_count or 0,
+    past_count=(total or 0) - (upcoming_count or 0),
+  )
+
+def page_arg(name):
+  return max(request.args.get(name, 1, type=int), 1)
+
+AVAILABILITY_LIMIT = 50
+
+def availability_window():
+  """``(start, end)`` from ?date=YYYY-MM-DD[&start=HH:MM[&minutes=N]]; the whole day by default."""
+  try:
+    day = datetime.strptime(request.args['date'], '%Y-%m-%d')
+    if 'start' not in request.args:
+      return day, day + timedelta(days=1)
+    start = datetime.combine(day, datetime.strptime(request.args['start'], '%H:%M').time())
+    minutes = int(request.args.get('minutes', DEFAULT_SHOW_MINUTES))
+  except (KeyError, ValueError):
+    abort(400)
+  if not 1 <= minutes <= MAX_SHOW_MINUTES:
+    abort(400)
+  return start, start + timedelta(minutes=minutes)
+
+def availability(model, show_column):
+  start, end = availability_window()
+  limit = min(max(request.args.get('limit', AVAILABILITY_LIMIT, type=int), 1), 500)
+  rows = free_in_area(model, show_column, request.args.get('city', ''), request.args.get('state', ''),
+    start, end, limit=limit)
+  return jsonify(start=start.isoformat(), end=end.isoformat(), free=rows)
+
+def encode_cursor(start_date, show_id):
+  """Opaque /shows cursor pointing just past the show (start_date, show_id)."""
+  raw = json.dumps([start_date.isoformat(), show_id]).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    start_date, show_id = json.loads(raw)
+    return datetime.fromisoformat(start_date), int(show_id)
+  except (ValueError, TypeError):
+    abort(400)
+
+def shows_feed(cursor=None, per_page=SHOWS_PER_PAGE):
+  """A page of shows, latest first, with their venue and artist joined in.
+
+  Paging is keyset based on ``(start_date, id)``: the cursor is the last row
+  of the previous page, so every page is an index range scan of ``per_page``
+  rows however far back it is. Returns ``(rows, next_cursor)``, where
+  ``next_cursor`` is None on the last page.
+  """
+  query = db.session.query(
+      Show.id, Show.start_date,
+      Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+      Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+    ).join(Venue, Venue.id == Show.venue_id
+    ).join(Artist, Artist.id == Show.artist_id)
+  if cursor:
+    query = query.filter(db.tuple_(Show.start_date, Show.id) < decode_cursor(cursor))
+  rows = query.order_by(Show.start_date.desc(), Show.id.desc()).limit(per_page + 1).all()
+
+  if len(rows) <= per_page:
+    return rows, None
+  rows = rows[:per_page]
+  return rows, encode_cursor(rows[-1].start_date, rows[-1].id)
+
+def name_key(model):
+  """``lower(name)``, on Postgres in the byte order of ix_<table>_name_lower.
+
+  That index answers ``name_key LIKE 'prefix%'`` as a range scan and hands
+  the rows out already in ``ORDER BY name_key`` order, so a LIMIT stops the
+  scan early.
+  """
+  key = db.func.lower(model.name)
+  return key.collate('C') if db.engine.dialect.name == 'postgresql' else key
+
+def name_starts_with(model, prefix):
+  return name_key(model).like(search.prefix_pattern(prefix.lower()), escape=search.LIKE_ESCAPE)
+
+def search_by_name(model, term, limit=search.SEARCH_LIMIT):
+  """Ranked ``(id, name)`` rows of ``model`` whose name contains ``term``.
+
+  Returns ``(total, rows)``, with ``total`` counted up to search.COUNT_LIMIT.
+  On Postgres each tier of matches is read bounded: names starting with
+  the term from the lower(name) index, in name order, then, while fewer
+  than ``limit`` have been found, at most search.RANK_CANDIDATES
+  word-prefix and then substring matches from the trigram index. Only
+  those are ranked, and the capped count rides along as a scalar
+  subquery, so the whole search is one query whose cost does not grow
+  with the number of matches. Elsewhere the matches are ranked in
+  process.
+  """
+  matches = model.name.ilike(search.contains_pattern(term), escape=search.LIKE_ESCAPE)
+
+  if db.engine.dialect.name != 'postgresql':
+    rows = db.session.query(model.id, model.name).filter(matches).all()
+    ranked, total = search.rank(term, rows, limit)
+    return min(total, search.COUNT_LIMIT), ranked
+
+  prefix = name_starts_with(model, term)
+  word_prefix = model.name.ilike('% ' + search.prefix_pattern(term), escape=search.LIKE_ESCAPE)
+  exact = db.case((db.func.lower(model.name) == term.lower(), search.EXACT), else_=search.PREFIX)
+  columns = (model.id.label('id'), model.name.label('name'))
+  # A tier only ranks below the ones before it, so it is read only while
+  # those hold fewer than ``limit`` rows; otherwise its one-time filter
+  # skips it without touching the table.
+  def found(*tiers):
+    counts = [ db.session.query(db.func.count()).select_from(tier).scalar_subquery() for tier in tiers ]
+    return sum(counts[1:], counts[0])
+  prefix_tier = db.session.query(*columns, exact.label('tier')
+    ).filter(prefix).order_by(name_key(model)).limit(limit).cte('prefix_tier')
+  word_tier = db.session.query(*columns, db.literal(search.WORD_PREFIX).label('tier')
+    ).filter(found(prefix_tier) < limit, word_prefix, ~prefix).limit(search.RANK_CANDIDATES).cte('word_tier')
+  substring_tier = db.session.query(*columns, db.literal(search.SUBSTRING).label('tier')
+    ).filter(found(prefix_tier, word_tier) < limit, matches, ~word_prefix, ~prefix).limit(search.RANK_CANDIDATES)
+  candidates = db.union_all(prefix_tier.select(), word_tier.select(), substring_tier.subquery().select()).subquery()
+  counted = db.session.query(model.id).filter(matches).limit(search.COUNT_LIMIT + 1).subquery()
+  total = db.session.query(db.func.count()).select_from(counted).scalar_subquery()
+  rows = db.session.query(candidates.c.id, candidates.c.name, total.label('total')
+    ).order_by(candidates.c.tier, db.func.similarity(candidates.c.name, term).desc(), db.func.lower(candidates.c.name)
+    ).limit(limit
+    ).all()
+  return (min(rows[0].total, search.COUNT_LIMIT) if rows else 0), rows
+
+def suggest_names(model, prefix, limit=search.SUGGEST_LIMIT):
+  """Names starting with ``prefix`` for search-as-you-type; no count, bounded by ``limit``."""
+  if not prefix:
+    return []
+  rows = db.session.query(model.id, model.name
+    ).filter(name_starts_with(model, prefix)
+    ).order_by(name_key(model)
+    ).limit(limit
+    ).all()
+  return [ dict(id=row.id, name=row.name) for row in rows ]
+
+def aggregate_version(*aggregates):
+  """One row holding each aggregate, every one its own scalar subquery."""
+  return tuple(db.session.query(*[ db.session.query(aggregate).scalar_subquery() for aggregate in aggregates ]).one())
+
+def detail_version(model, owner_column, other, other_column, row_id, now=None):
+  """Version token of a venue's or artist's page, None if there is no such row.
+
+  Covers the row itself, its shows (how many, how many upcoming, latest
+  change) and the latest change to whoever is on the other end of them,
+  since their names are on the page.
+  """
+  now = now or datetime.today()
+  return db.session.query(
+      model.updated_at, db.func.count(Show.id), db.func.sum(db.case((Show.start_date > now, 1), else_=0)),
+      db.func.max(Show.updated_at), db.func.max(other.updated_at)
+    ).outerjoin(Show, owner_column == model.id
+    ).outerjoin(other, other.id == other_column
+    ).filter(model.id == row_id
+    ).group_by(model.id, model.updated_at
+    ).first()
+
+def venue_version(venue_id):
+  row = detail_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+  return tuple(row) if row else None
+
+def artist_version(artist_id):
+  row = detail_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+  return tuple(row) if row else None
+
+def venues_version():
+  # The area counts go stale when a show starts; area_index() recounts
+  # those, so such a request is always rendered.
+  version = aggregate_version(db.func.count(Venue.id), db.func.max(Venue.updated_at),
+    db.func.max(Area.refreshed_at), db.func.min(Area.stale_after))
+  if version[3] is not None and version[3] <= datetime.today():
+    return None
+  return version
+
+def artists_version():
+  return aggregate_version(db.func.count(Artist.id), db.func.max(Artist.updated_at))
+
+def shows_version():
+  return aggregate_version(db.func.count(Show.id), db.func.max(Show.updated_at),
+    db.func.max(Venue.updated_at), db.func.max(Artist.updated_at))
+
+def venue_cache_groups(venue_id):
+  """Cached pages that show venue ``venue_id``: its own, the listings and its artists'."""
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:%d' % venue_id] + [ 'artist:%d' % row[0] for row in artist_ids ]
+
+def artist_cache_groups(artist_id):
+  """Cached pages that show artist ``artist_id``: its own, the listings and its venues'."""
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  # /venues counts the artist's upcoming shows.
+  return ['venues', 'artists', 'shows', 'artist:%d' % artist_id] + [ 'venue:%d' % row[0] for row in venue_ids ]
+
+#----------------------------------------------------------------------------#
+# Writes.
+#----------------------------------------------------------------------------#
+
+# Each of these runs on the write pipeline's worker, inside a batch's
+# transaction, and returns (id, cache groups to invalidate after commit).
+
+# Model column -> form field, for the columns whose names differ.
+VENUE_FORM_FIELDS = dict(website='website_link', seeking_talents='seeking_talent')
+ARTIST_FORM_FIELDS = dict(website='website_link', seeking_venue_description='seeking_description')
+
+def form_values(form, model, renamed):
+  """Column values for ``model`` from the form fields that map onto its columns."""
+  return { column: form[renamed.get(column, column)].data for column in model.__table__.columns.keys()
+           if renamed.get(column, column) in form }
+
+def form_data(row, renamed):
+  """Initial form data from a model instance; the inverse of form_values."""
+  return { renamed.get(column, column): getattr(row, column) for column in row.__table__.columns.keys() }
+
+def venue_values(form):
+  return form_values(form, Venue, VENUE_FORM_FIELDS)
+
+def artist_values(form):
+  return form_values(form, Artist, ARTIST_FORM_FIELDS)
+
+def show_values(form):
+  return dict(
+    start_date = form.start_time.data,
+    duration_minutes = form.duration_minutes.data,
+    artist_id = form.artist_id.data,
+    venue_id = form.venue_id.data,
+  )
+
+def insert_venue(values):
+  venue = Venue(**values)
+  db.session.add(venue)
+  refresh_areas((venue.city, venue.state))
+  return venue.id, ['venues']
+
+def update_venue(venue_id, values):
+  venue = Venue.query.get(venue_id)
+  if venue is None:
+    raise LookupError('venue %d does not exist' % venue_id)
+  old_area = (venue.city, venue.state)
+  for name, value in values.items():
+    setattr(venue, name, value)
+  refresh_areas(old_area, (venue.city, venue.state))
+  return venue_id, venue_cache_groups(venue_id)
+
+def insert_artist(values):
+  artist = Artist(**values)
+  db.session.add(artist)
+  db.session.flush()
+  return artist.id, ['artists']
+
+def update_artist(artist_id, values):
+  artist = Artist.query.get(artist_id)
+  if artist is None:
+    raise LookupError('artist %d does not exist' % artist_id)
+  for name, value in values.items():
+    setattr(artist, name, value)
+  db.session.flush()
+  return artist_id, artist_cache_groups(artist_id)
+
+def insert_show(values):
+  venue = Venue.query.get(values['venue_id'])
+  if venue is None:
+    raise LookupError('venue %d does not exist' % values['venue_id'])
+  if Artist.query.get(values['artist_id']) is None:
+    raise LookupError('artist %d does not exist' % values['artist_id'])
+  end = values['start_date'] + timedelta(minutes=values['duration_minutes'])
+  # The pipeline's worker writes one batch at a time, so nothing in this
+  # process can book the slot before the commit; on Postgres the exclusion
+  # constraints also catch other processes.
+  check_schedule(values['venue_id'], values['artist_id'], values['start_date'], end)
+  show = Show(end_date=end, **values)
+  db.session.add(show)
+  refresh_areas((venue.city, venue.state))
+  return show.id, ['venues', 'shows', 'venue:%d' % show.venue_id, 'artist:%d' % show.artist_id]
+
+def submit_write(kind, apply):
+  """Queue ``apply`` on the write pipeline and wait a while for its outcome.
+
+  The request holds no database connection meanwhile. The submission is
+  returned either way; its ``status`` is still 'pending' if the wait ran out.
+  """
+  submission = write_pipeline.submit(kind, apply)
+  submission.wait(app.config['WRITE_WAIT_SECONDS'])
+  # The worker wrote through its own session; drop anything this one loaded.
+  db.session.expire_all()
+  return submission
+
+#----------------------------------------------------------------------------#
+# Deletes.
+#----------------------------------------------------------------------------#
+
+def purge_step(model, owner_column, row_id):
+  """Purge job step for a soft-deleted row: its shows a batch at a time, then the row."""
+  shows, table = Show.__table__, model.__table__
+  def step(batch_size):
+    batch = db.select(shows.c.id).where(shows.c[owner_column] == row_id).limit(batch_size)
+    deleted = db.session.execute(shows.delete().where(shows.c.id.in_(batch.scalar_subquery()))).rowcount
+    if deleted < batch_size:
+      db.session.execute(table.delete().where(table.c.id == row_id, table.c.deleted_at.isnot(None)))
+      return deleted, True
+    return deleted, False
+  return step
+
+def soft_delete(kind, row, owner_column, cache_groups):
+  """Mark ``row`` deleted and queue the removal of it and its shows.
+
+  The request only updates the row and the areas it counts in: a venue's
+  own, or the areas of the venues holding an artist's upcoming shows.
+  However many shows it has, they vanish from every query at once and
+  are deleted by the purge queue. Returns the purge job.
+  """
+  now = datetime.today()
+  stale = cache_groups(row.id)
+  total = Show.query.filter(getattr(Show, owner_column) == row.id).count()
+  if kind == 'venue':
+    areas = [(row.city, row.state)]
+  else:
+    areas = [ tuple(area) for area in db.session.query(Venue.city, Venue.state).join(Show, Show.venue_id == Venue.id
+      ).filter(getattr(Show, owner_column) == row.id, Show.start_date > now).distinct() ]
+  row.deleted_at = now
+  refresh_areas(*areas, now=now)
+  db.session.commit()
+  page_cache.invalidate(*stale)
+  return purge_queue.submit(kind, row.id, total, purge_step(type(row), owner_column, row.id))
+
+def deleted_rows(model):
+  """Ids of ``model`` rows marked deleted and not yet purged."""
+  return [ row.id for row in model.query.execution_options(include_deleted=True
+    ).filter(model.deleted_at.isnot(None)).order_by(model.deleted_at) ]
+
+def flash_outcome(submission, committed, failed):
+  if submission.status == 'committed':
+    flash(committed)
+  elif submission.status == 'failed':
+    flash(failed)
+  else:
+    flash('%s is still being saved; check /submissions/%s for the outcome.' % (
+      submission.kind.capitalize(), submission.ticket))
+
+def flash_form_errors(form):
+  for name, errors in form.errors.items():
+    flash('%s: %s' % (name.replace('_', ' '), ', '.join(errors)))
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -105,67 +916,77 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues', methods=['GET'])
+@conditional(venues_version)
+@page_cache.cached('venues')
 def venues():
-
-  rows = Venue.query.all()
-
-  venues_dict = {}
-  for row in rows:
-    city_state = (row.city, row.state)
-    if city_state not in venues_dict.keys():
-      venues_dict[city_state] = []
-    venues_dict[city_state].append(dict(
-      id = row.id,
-      name = row.name, 
-      upcoming_shows = Show.query.filter(Show.venue_id == row.id, Show.start_date > datetime.today()).count()
-    ))
-
-  data = [ dict(city=k[0], state=k[1], venues=v) for k, v in venues_dict.items() ]
-  return render_template('pages/venues.html', areas = data)
+  # The landing page lists areas only; their venues load per area below.
+  genre = request.args.get('genre')
+  areas = venue_areas(genre=genre) if genre else area_index()
+  return render_template('pages/venues.html', areas=areas,
+    genres=genre_facets(Venue), current_genre=genre)
+
+@app.route('/venues/area')
+@conditional(venues_version)
+@page_cache.cached('venues')
+def area_venues():
+  # ?partial=1 returns just the list, for the landing page to append.
+  city, state = request.args.get('city', ''), request.args.get('state', '')
+  area = Area.query.filter_by(city=city, state=state).first_or_404()
+  page = page_arg('page')
+  venues, has_more = area_venues_page(city, state, page)
+  next_url = url_for('area_venues', city=city, state=state, page=page + 1) if has_more else None
+  template = 'pages/venue_area_list.html' if request.args.get('partial') else 'pages/venue_area.html'
+  return render_template(template, area=area, venues=venues, next_url=next_url)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
 
   search_term=request.form.get('search_term','')
-  result_set = Venue.query.filter(Venue.name.ilike('%'+ search_term +'%'))
+  count, rows = search_by_name(Venue, search_term)
+  upcoming = upcoming_show_counts(Show.venue_id, [ venue.id for venue in rows ])
 
-  count = result_set.count()
+  data = [ dict(
+    id = venue.id,
+    name = venue.name,
+    num_of_upcoming_shows = upcoming[venue.id]
+  ) for venue in rows ]
 
-  data =  []
-  for venue in result_set.all():
-    dic = dict(
-      id = venue.id,
-      name = venue.name,
-      num_of_upcoming_shows = Show.query.filter_by(id=venue.id).count()  
-    )
-    data.append(dic)
-  
   response={
     "count": count,
     "data": data
   }
 
-  return render_template('pages/search_venues.html', results=response)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
+@app.route('/venues/search/suggest')
+def suggest_venues():
+  return jsonify(suggest_names(Venue, request.args.get('q', '')))
 
-  venue = Venue.query.filter_by(id = venue_id).first()
-  shows = Show.query.filter(Show.venue_id==venue_id)
+@app.route('/venues/available')
+def available_venues():
+  # e.g. ?city=San Francisco&state=CA&date=2035-05-21&start=20:00&minutes=120
+  return availability(Venue, Show.venue_id)
 
-  past_shows = [{"artist_id": show.artist.id,
-                  "artist_name": show.artist.name,
-                  "artist_image_link": show.artist.image_link,
-                  "start_time": show.start_date.strftime("%m/%d/%Y, %H:%M:%S")
-                  } for show in shows.all() if show.start_date < datetime.today() ]          
-  upcoming_shows = [{"artist_id": show.artist.id,
-                  "artist_name": show.artist.name,
-                  "artist_image_link": show.artist.image_link,
-                  "start_time": show.start_date.strftime("%m/%d/%Y, %H:%M:%S")
-                  } for show in shows.all() if show.start_date > datetime.today()  ]
+@app.route('/venues/<int:venue_id>')
+@conditional(venue_version)
+@page_cache.cached(lambda venue_id: 'venue:%d' % venue_id)
+def show_venue(venue_id):
 
-  past_shows_count = len(past_shows)
-  upcoming_shows_count = len(upcoming_shows)
+  venue = Venue.query.get_or_404(venue_id)
+  upcoming_page, past_page = page_arg('upcoming_page'), page_arg('past_page')
+  shows = detail_page_shows(Show.venue_id, venue_id, Artist,
+    upcoming_page=upcoming_page, past_page=past_page)
+
+  past_shows = [{"artist_id": show.id,
+                  "artist_name": show.name,
+                  "artist_image_link": show.image_link,
+                  "start_time": show.start_date
+                  } for show in shows['past'] ]
+  upcoming_shows = [{"artist_id": show.id,
+                  "artist_name": show.name,
+                  "artist_image_link": show.image_link,
+                  "start_time": show.start_date
+                  } for show in shows['upcoming'] ]
 
   data = {
       "id": venue.id,
@@ -182,8 +1003,11 @@ def show_venue(venue_id):
       "image_link": venue.image_link,
       "past_shows": past_shows,
       "upcoming_shows": upcoming_shows,
-      "past_shows_count": past_shows_count,
-      "upcoming_shows_count": upcoming_shows_count,
+      "past_shows_count": shows['past_count'],
+      "upcoming_shows_count": shows['upcoming_count'],
+      "past_page": past_page,
+      "upcoming_page": upcoming_page,
+      "per_page": DETAIL_SHOWS_PER_PAGE,
   }
 
   return render_template('pages/show_venue.html', venue=data)
@@ -198,99 +1022,93 @@ def create_venue_form():
 
 @app.route('/venues/create', methods=['POST'])
 def create_venue_submission():
-  # TODO: insert form data as a new Venue record in the db, instead
   form = VenueForm(request.form)
-  venue = Venue(
-    name = form.name.data,
-    genres = form.genres.data,
-    address = form.address.data,
-    city = form.city.data,
-    state = form.state.data,
-    phone = form.phone.data,
-    website = form.website_link.data,
-    facebook_link = form.facebook_link.data,
-    seeking_talents = form.seeking_talent.data,
-    seeking_description = form.seeking_description.data,
-    image_link = form.image_link.data
-  )
-  try:
-    db.session.add(venue)
-    db.session.commit()
-    # on successful db insert, flash success
-    flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  except:
-    db.session.rollback()
-    # TODO: on unsuccessful db insert, flash an error instead.
-    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
-  finally:
-    db.session.close()
-    return redirect(url_for('venues'))
+  if not form.validate():
+    flash_form_errors(form)
+    return render_template('forms/new_venue.html', form=form), 400
+  values = venue_values(form)
+  submission = submit_write('venue', lambda: insert_venue(values))
+  flash_outcome(submission,
+    'Venue ' + values['name'] + ' was successfully listed!',
+    'An error occurred. Venue ' + values['name'] + ' could not be listed.')
+  return redirect(url_for('venues'))
 
 @app.route('/venues/delete/<int:venue_id>')
 def delete_venue(venue_id):
-  # TODO: Complete this endpoint for taking a venue_id, and using
-  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  venue = Venue.query.get_or_404(venue_id)
   try:
-    venue = Venue.query.get_or_404(venue_id)
-    db.session.delete(venue)
-    db.session.commit()
+    soft_delete('venue', venue, 'venue_id', venue_cache_groups)
     flash("Venue was successfully deleted!")
-    return redirect(url_for('venues'))
-  except:
+  except SQLAlchemyError:
+    db.session.rollback()
+    app.logger.exception('deleting venue %d failed', venue_id)
     flash("There was an error deleting venue")
-    return None
+  return redirect(url_for('venues'))
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(artists_version)
+@page_cache.cached('artists')
 def artists():
-  artists = Artist.query.all()
+  genre = request.args.get('genre')
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = with_genre(query, Artist, genre)
 
   data=[ {
     "id": artist.id,
     "name": artist.name,
-  } for artist in artists ]
+  } for artist in query.order_by(Artist.id) ]
 
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data,
+    genres=genre_facets(Artist), current_genre=genre)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   search_term=request.form.get('search_term', '')
-  search_result = Artist.query.filter(Artist.name.ilike('%' + search_term + '%'))
-  count = search_result.count()
+  count, rows = search_by_name(Artist, search_term)
+  upcoming = upcoming_show_counts(Show.artist_id, [ artist.id for artist in rows ])
   data = [ {
     "id": artist.id,
     "name": artist.name,
-    "num_upcoming_shows": len(artist.shows)
-    } for artist in search_result.all() ]
+    "num_upcoming_shows": upcoming[artist.id]
+    } for artist in rows ]
 
   response={
     "count": count,
     "data": data
   }
-  return render_template('pages/search_artists.html', results=response)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@app.route('/artists/search/suggest')
+def suggest_artists():
+  return jsonify(suggest_names(Artist, request.args.get('q', '')))
+
+@app.route('/artists/available')
+def available_artists():
+  return availability(Artist, Show.artist_id)
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_version)
+@page_cache.cached(lambda artist_id: 'artist:%d' % artist_id)
 def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
 
-  artist = Artist.query.get(artist_id)
-  shows = Show.query.filter(Show.artist_id==artist_id)
-
-  past_shows = [{"venue_id": show.venue.id,
-                  "venue_name": show.venue.name,
-                  "venue_image_link": show.venue.image_link,
-                  "start_time": show.start_date.strftime("%m/%d/%Y, %H:%M:%S")
-                  } for show in shows.all() if show.start_date < datetime.today() ]          
-  upcoming_shows = [{"venue_id": show.venue.id,
-                  "venue_name": show.venue.name,
-                  "venue_image_link": show.venue.image_link,
-                  "start_time": show.start_date.strftime("%m/%d/%Y, %H:%M:%S")
-                  } for show in shows.all() if show.start_date > datetime.today()  ]
-
-  past_shows_count = len(past_shows)
-  upcoming_shows_count = len(upcoming_shows)
+  artist = Artist.query.get_or_404(artist_id)
+  upcoming_page, past_page = page_arg('upcoming_page'), page_arg('past_page')
+  shows = detail_page_shows(Show.artist_id, artist_id, Venue,
+    upcoming_page=upcoming_page, past_page=past_page)
+
+  past_shows = [{"venue_id": show.id,
+                  "venue_name": show.name,
+                  "venue_image_link": show.image_link,
+                  "start_time": show.start_date
+                  } for show in shows['past'] ]
+  upcoming_shows = [{"venue_id": show.id,
+                  "venue_name": show.name,
+                  "venue_image_link": show.image_link,
+                  "start_time": show.start_date
+                  } for show in shows['upcoming'] ]
 
   data = {
       "id": artist.id,
@@ -306,88 +1124,69 @@ def show_artist(artist_id):
       "image_link": artist.image_link,
       "past_shows": past_shows,
       "upcoming_shows": upcoming_shows,
-      "past_shows_count": past_shows_count,
-      "upcoming_shows_count": upcoming_shows_count,
+      "past_shows_count": shows['past_count'],
+      "upcoming_shows_count": shows['upcoming_count'],
+      "past_page": past_page,
+      "upcoming_page": upcoming_page,
+      "per_page": DETAIL_SHOWS_PER_PAGE,
   }
 
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
 #  ----------------------------------------------------------------
+@app.route('/artists/delete/<int:artist_id>')
+def delete_artist(artist_id):
+  artist = Artist.query.get_or_404(artist_id)
+  try:
+    soft_delete('artist', artist, 'artist_id', artist_cache_groups)
+    flash("Artist was successfully deleted!")
+  except SQLAlchemyError:
+    db.session.rollback()
+    app.logger.exception('deleting artist %d failed', artist_id)
+    flash("There was an error deleting artist")
+  return redirect(url_for('artists'))
+
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  form = ArtistForm(request.form)
-  artist = Artist.query.get(artist_id)
-  
-  form.name.data = artist.name
-  form.genres.data = artist.genres
-  form.city.data = artist.city
-  form.state.data = artist.state
-  form.phone.data = artist.phone
-  form.website_link.data = artist.website
-  form.facebook_link.data = artist.facebook_link
-  form.seeking_venue.data = artist.seeking_venue
-  form.seeking_description.data = artist.seeking_venue_description
-  form.image_link.data = artist.image_link
-
+  artist = Artist.query.get_or_404(artist_id)
+  form = ArtistForm(formdata=None, data=form_data(artist, ARTIST_FORM_FIELDS))
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
  
-  form_data = ArtistForm(request.form)
-  artist = Artist.query.get(artist_id)
-  artist.name = form_data.name.data
-  artist.genres = form_data.genres.data
-  artist.city = form_data.city.data
-  artist.state = form_data.state.data
-  artist.phone = form_data.phone.data
-  artist.website = form_data.website_link.data
-  artist.facebook_link = form_data.facebook_link.data
-  artist.image_link = form_data.image_link.data
-  artist.seeking_venue = form_data.seeking_venue.data
-  artist.seeking_venue_description = form_data.seeking_description.data
-  db.session.commit()
+  form = ArtistForm(request.form)
+  if not form.validate():
+    flash_form_errors(form)
+    return render_template('forms/edit_artist.html', form=form,
+      artist=dict(id=artist_id, name=form.name.data)), 400
+  values = artist_values(form)
+  submission = submit_write('artist', lambda: update_artist(artist_id, values))
+  flash_outcome(submission,
+    'Artist ' + values['name'] + ' was successfully updated!',
+    'An error occurred. Artist ' + values['name'] + ' could not be updated.')
   return redirect(url_for('show_artist', artist_id= artist_id))
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-  
-  venue = Venue.query.get(venue_id)
-
-  form = VenueForm(request.form)
-  form.name.data = venue.name
-  form.city.data = venue.city
-  form.state.data = venue.state
-  form.genres.data = venue.genres
-  form.address.data = venue.address
-  form.website_link.data = venue.website
-  form.facebook_link.data = venue.facebook_link
-  form.image_link.data = venue.image_link
-  form.seeking_talent.data = venue.seeking_talents
-  form.seeking_description.data = venue.seeking_description
-
+  venue = Venue.query.get_or_404(venue_id)
+  form = VenueForm(formdata=None, data=form_data(venue, VENUE_FORM_FIELDS))
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
 
   form = VenueForm(request.form)
-
-  venue = Venue.query.get(venue_id)
-
-  venue.name = form.name.data
-  venue.genres = form.genres.data
-  venue.city = form.city.data
-  venue.state = form.state.data
-  venue.address = form.address.data
-  venue.phone = form.phone.data
-  venue.website = form.website_link.data
-  venue.facebook_link = form.facebook_link.data
-  venue.seeking_talents = form.seeking_talent.data
-  venue.seeking_description = form.seeking_description.data
-  venue.image_link = form.image_link.data
-  db.session.commit()
+  if not form.validate():
+    flash_form_errors(form)
+    return render_template('forms/edit_venue.html', form=form,
+      venue=dict(id=venue_id, name=form.name.data)), 400
+  values = venue_values(form)
+  submission = submit_write('venue', lambda: update_venue(venue_id, values))
+  flash_outcome(submission,
+    'Venue ' + values['name'] + ' was successfully updated!',
+    'An error occurred. Venue ' + values['name'] + ' could not be updated.')
 
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -396,55 +1195,51 @@ def edit_venue_submission(venue_id):
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
-  form = ArtistForm(request.form)
+  form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
 @app.route('/artists/create', methods=['POST'])
 def create_artist_submission():
  
   form  = ArtistForm(request.form)
-  artist = Artist(
-      name = form.name.data,
-      genres = form.genres.data,
-      city = form.city.data,
-      state = form.state.data,
-      phone = form.phone.data,
-      website = form.website_link.data,
-      facebook_link = form.facebook_link.data,
-      image_link = form.image_link.data,
-      seeking_venue = form.seeking_venue.data,
-      seeking_venue_description = form.seeking_description.data
-    )
-  try:
-    db.session.add(artist)
-    db.session.commit()
-    flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    return redirect(url_for('artists'))
-  except:
-    flash(' Error occured while trying to create artist ' + request.form['name']+ '!!')
-    return render_template('pages/home.html')
-  finally:
-    db.session.close()
+  if not form.validate():
+    flash_form_errors(form)
+    return render_template('forms/new_artist.html', form=form), 400
+  values = artist_values(form)
+  submission = submit_write('artist', lambda: insert_artist(values))
+  flash_outcome(submission,
+    'Artist ' + values['name'] + ' was successfully listed!',
+    ' Error occured while trying to create artist ' + values['name'] + '!!')
+  return redirect(url_for('artists'))
 
 
 #  Shows
 #  ----------------------------------------------------------------
 
+def format_shows(rows):
+  return [ {
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_date
+  } for show in rows ]
+
 @app.route('/shows')
+@conditional(shows_version)
+@page_cache.cached('shows')
 def shows():
- 
-  shows = Show.query.all()
-  
-  data = [ {
-    "venue_id": show.venue.id,
-    "venue_name": show.venue.name,
-    "artist_id": show.artist.id,
-    "artist_name": show.artist.name,
-    "artist_image_link": show.artist.image_link,
-    "start_time": show.start_date.strftime("%m/%d/%Y, %H:%M:%S")
-  } for show in shows ]
 
-  return render_template('pages/shows.html', shows=data)
+  rows, next_cursor = shows_feed(request.args.get('cursor'))
+  return render_template('pages/shows.html', shows=format_shows(rows), next_cursor=next_cursor)
+
+@app.route('/shows/feed')
+def shows_feed_json():
+  # JSON pages of /shows for infinite scroll; pass next_cursor back as ?cursor=.
+  rows, next_cursor = shows_feed(request.args.get('cursor'))
+  data = [ dict(show, start_time=show['start_time'].isoformat()) for show in format_shows(rows) ]
+  return jsonify(shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -455,27 +1250,237 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   form = ShowForm(request.form)
-  new_show = Show(
-    start_date = form.start_time.data,
-    artist_id = form.artist_id.data,
-    venue_id = form.venue_id.data
-  )
+  if not form.validate():
+    flash_form_errors(form)
+    return render_template('forms/new_show.html', form=form), 400
+  values = show_values(form)
+  submission = submit_write('show', lambda: insert_show(values))
+  flash_outcome(submission,
+    'Show was successfully listed!',
+    'Show could not be listed: %s' % submission.error)
+  return redirect(url_for('shows'))
+
+@app.route('/submissions/<ticket>')
+def submission_status(ticket):
+  submission = write_pipeline.get(ticket)
+  if submission is None:
+    abort(404)
+  return jsonify(submission.to_dict())
+
+#  API
+#  ----------------------------------------------------------------
 
+# /api/v1 mirrors the HTML routes as JSON. List endpoints stream rows from
+# a server-side cursor, and every GET takes ?fields=a,b to select only the
+# columns it needs; detail endpoints skip their show query unless 'shows'
+# is among the fields.
+
+API_STREAM_ROWS = 1000
+
+VENUE_API_FIELDS = {
+  'id': Venue.id, 'name': Venue.name, 'city': Venue.city, 'state': Venue.state,
+  'address': Venue.address, 'phone': Venue.phone, 'genres': Venue.genres,
+  'image_link': Venue.image_link, 'website': Venue.website, 'facebook_link': Venue.facebook_link,
+  'seeking_talent': Venue.seeking_talents, 'seeking_description': Venue.seeking_description,
+}
+ARTIST_API_FIELDS = {
+  'id': Artist.id, 'name': Artist.name, 'city': Artist.city, 'state': Artist.state,
+  'phone': Artist.phone, 'genres': Artist.genres, 'image_link': Artist.image_link,
+  'website': Artist.website, 'facebook_link': Artist.facebook_link,
+  'seeking_venue': Artist.seeking_venue, 'seeking_description': Artist.seeking_venue_description,
+}
+SHOW_API_FIELDS = {
+  'id': Show.id, 'venue_id': Show.venue_id, 'artist_id': Show.artist_id,
+  'start_time': Show.start_date, 'end_time': Show.end_date, 'duration_minutes': Show.duration_minutes,
+  'venue_name': Venue.name, 'artist_name': Artist.name, 'artist_image_link': Artist.image_link,
+}
+SHOW_API_JOINS = {'venue_name': Venue, 'artist_name': Artist, 'artist_image_link': Artist}
+
+def api_fields(available):
   try:
-    db.session.add(new_show)
-    db.session.commit()
-    flash('Show was successfully listed!')
-    return redirect(url_for('shows'))
-  except:
-    flash('Show '+ form.name.data + 'was not successfully created!')
-    return render_template('pages/home.html')
+    return jsonstream.parse_fields(request.args.get('fields'), available)
+  except jsonstream.FieldError as error:
+    abort(400, str(error))
+
+def api_stream(key, query, fields):
+  rows = query.execution_options(stream_results=True).yield_per(API_STREAM_ROWS)
+  return Response(stream_with_context(jsonstream.stream_document(key, rows, fields)),
+    mimetype='application/json')
+
+def api_list(key, model, available):
+  """Stream every ``model`` row, filtered by ?genre=, ?city= and ?state=."""
+  fields = api_fields(available)
+  query = db.session.query(*[ available[name] for name in fields ])
+  if request.args.get('genre'):
+    query = with_genre(query, model, request.args['genre'])
+  for name in ('city', 'state'):
+    if request.args.get(name):
+      query = query.filter(getattr(model, name) == request.args[name])
+  return api_stream(key, query.order_by(model.id), fields)
+
+def api_detail(model, available, row_id, owner_column, other, other_name):
+  fields = api_fields(list(available) + ['shows'])
+  names = [ name for name in fields if name != 'shows' ]
+  row = db.session.query(model.id, *[ available[name] for name in names ]).filter(model.id == row_id).first()
+  if row is None:
+    abort(404)
+  data = dict(zip(names, row[1:]))
+  if 'shows' in fields:
+    upcoming_page, past_page = page_arg('upcoming_page'), page_arg('past_page')
+    shows = detail_page_shows(owner_column, row_id, other, upcoming_page=upcoming_page, past_page=past_page)
+
+    def show(row):
+      return {other_name + '_id': row.id, other_name + '_name': row.name,
+              other_name + '_image_link': row.image_link, 'start_time': row.start_date}
+    data.update(
+      upcoming_shows=[ show(row) for row in shows['upcoming'] ],
+      past_shows=[ show(row) for row in shows['past'] ],
+      upcoming_shows_count=shows['upcoming_count'],
+      past_shows_count=shows['past_count'],
+      upcoming_page=upcoming_page, past_page=past_page, per_page=DETAIL_SHOWS_PER_PAGE,
+    )
+  return Response(jsonstream.dumps(data), mimetype='application/json')
+
+def api_search(model, show_column):
+  count, rows = search_by_name(model, request.args.get('q', ''))
+  upcoming = upcoming_show_counts(show_column, [ row.id for row in rows ])
+  return jsonify(count=count, data=[ dict(id=row.id, name=row.name, num_upcoming_shows=upcoming[row.id])
+                                     for row in rows ])
+
+def api_form(form_class):
+  """``form_class`` filled from the JSON request body; lists become repeated values."""
+  payload = request.get_json(silent=True)
+  if not isinstance(payload, dict):
+    abort(400, 'expected a JSON object')
+  formdata = MultiDict()
+  for name, value in payload.items():
+    for item in value if isinstance(value, list) else [value]:
+      if item is not None and item is not False:
+        formdata.add(name, 'y' if item is True else str(item))
+  return form_class(formdata=formdata, meta={'csrf': False})
+
+def api_submission(kind, apply, endpoint=None):
+  """201 once committed, 202 while still queued, 422 if the write failed."""
+  submission = submit_write(kind, apply)
+  response = jsonify(submission.to_dict())
+  if submission.status == 'committed':
+    response.status_code = 201
+    if endpoint:
+      response.headers['Location'] = url_for(endpoint, **{kind + '_id': submission.id})
+  elif submission.status == 'failed':
+    response.status_code = 422
+  else:
+    response.status_code = 202
+    response.headers['Location'] = url_for('submission_status', ticket=submission.ticket)
+  return response
+
+@app.route('/api/v1/venues')
+def api_venues():
+  return api_list('venues', Venue, VENUE_API_FIELDS)
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@conditional(venue_version)
+def api_venue(venue_id):
+  return api_detail(Venue, VENUE_API_FIELDS, venue_id, Show.venue_id, Artist, 'artist')
+
+@app.route('/api/v1/venues/search')
+def api_search_venues():
+  return api_search(Venue, Show.venue_id)
+
+@app.route('/api/v1/venues', methods=['POST'])
+def api_create_venue():
+  form = api_form(VenueForm)
+  if not form.validate():
+    return jsonify(errors=form.errors), 422
+  values = venue_values(form)
+  return api_submission('venue', lambda: insert_venue(values), 'api_venue')
+
+@app.route('/api/v1/artists')
+def api_artists():
+  return api_list('artists', Artist, ARTIST_API_FIELDS)
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@conditional(artist_version)
+def api_artist(artist_id):
+  return api_detail(Artist, ARTIST_API_FIELDS, artist_id, Show.artist_id, Venue, 'venue')
+
+@app.route('/api/v1/artists/search')
+def api_search_artists():
+  return api_search(Artist, Show.artist_id)
+
+@app.route('/api/v1/artists', methods=['POST'])
+def api_create_artist():
+  form = api_form(ArtistForm)
+  if not form.validate():
+    return jsonify(errors=form.errors), 422
+  values = artist_values(form)
+  return api_submission('artist', lambda: insert_artist(values), 'api_artist')
+
+@app.route('/api/v1/shows')
+def api_shows():
+  # Latest first, like /shows; ?venue_id= and ?artist_id= narrow it down.
+  fields = api_fields(SHOW_API_FIELDS)
+  query = db.session.query(*[ SHOW_API_FIELDS[name] for name in fields ]).select_from(Show)
+  for model in { SHOW_API_JOINS[name] for name in fields if name in SHOW_API_JOINS }:
+    query = query.join(model, model.id == (Show.venue_id if model is Venue else Show.artist_id))
+  for name in ('venue_id', 'artist_id'):
+    if request.args.get(name, type=int):
+      query = query.filter(getattr(Show, name) == request.args.get(name, type=int))
+  return api_stream('shows', query.order_by(Show.start_date.desc(), Show.id.desc()), fields)
+
+@app.route('/api/v1/shows', methods=['POST'])
+def api_create_show():
+  form = api_form(ShowForm)
+  if not form.validate():
+    return jsonify(errors=form.errors), 422
+  values = show_values(form)
+  return api_submission('show', lambda: insert_show(values))
+
+#  Admin
+#  ----------------------------------------------------------------
+
+@app.route('/admin/cache')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
+@app.route('/admin/pool')
+def pool_stats():
+  return jsonify(pool_metrics.snapshot(db.engine.pool))
+
+@app.route('/admin/writes')
+def write_stats():
+  return jsonify(write_pipeline.stats())
+
+@app.route('/admin/purges')
+def purge_stats():
+  return jsonify(purge_queue.stats(), jobs=[ job.to_dict() for job in purge_queue.jobs() ])
+
+@app.route('/admin/purges/<ticket>')
+def purge_status(ticket):
+  job = purge_queue.get(ticket)
+  if job is None:
+    abort(404)
+  return jsonify(job.to_dict())
+
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+@app.errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error)
+    return error
 
 @app.errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error)
     return render_template('errors/404.html'), 404
 
 @app.errorhandler(500)
 def server_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error)
     return render_template('errors/500.html'), 500
 
 
@@ -489,6 +1494,169 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# CLI.
+#----------------------------------------------------------------------------#
+
+catalog_cli = AppGroup('catalog', help='Bulk import and export of venues, artists and shows.')
+CATALOG_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+@catalog_cli.command('import')
+@click.argument('kind', type=click.Choice(CATALOG_MODELS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows sent to the database per batch.')
+@click.option('--dry-run', is_flag=True, help='Load every row, then roll back.')
+def import_catalog(kind, path, chunk_size, dry_run):
+  """Load a CSV or JSONL file of KIND into the database.
+
+  Shows are loaded with COPY on Postgres, venues and artists with batched
+  executemany, each chunk inside a savepoint. Rows that do not parse,
+  shows whose venue_id or artist_id does not exist, and rows the database
+  rejects (a missing required value, a duplicate) are reported and
+  skipped. A dry run does all of it, constraints included, and rolls
+  back.
+  """
+  table = CATALOG_MODELS[kind].__table__
+  fmt = catalog_io.file_format(path)
+  references = {}
+  if kind == 'shows':
+    references = {
+      'venue_id': { row[0] for row in db.session.query(Venue.id) },
+      'artist_id': { row[0] for row in db.session.query(Artist.id) },
+    }
+  use_copy = kind == 'shows' and db.engine.dialect.name == 'postgresql'
+  dbapi = db.engine.dialect.dbapi
+  # COPY goes through the raw DBAPI cursor, so its errors are not wrapped.
+  rejected = (IntegrityError, DataError, dbapi.IntegrityError, dbapi.DataError)
+  columns, imported, skipped = None, 0, 0
+
+  def load(connection, rows, records):
+    """Insert ``rows``; returns the number loaded. Rejected rows are reported."""
+    savepoint = connection.begin_nested()
+    try:
+      if use_copy:
+        catalog_io.copy_rows(connection, table, columns, rows)
+      else:
+        connection.execute(table.insert(), rows)
+      savepoint.commit()
+      return len(rows)
+    except rejected as error:
+      savepoint.rollback()
+      if len(rows) > 1:
+        # Find the rows at fault one at a time.
+        return sum(load_one(connection, row, record) for row, record in zip(rows, records))
+      click.echo('skipped %r: %s' % (records[0], str(getattr(error, 'orig', error)).splitlines()[0]), err=True)
+      return 0
+
+  def load_one(connection, row, record):
+    nonlocal use_copy
+    copying, use_copy = use_copy, False
+    try:
+      return load(connection, [row], [record])
+    finally:
+      use_copy = copying
+
+  with open(path, newline='') as fh, db.engine.connect() as connection:
+    transaction = connection.begin()
+    for chunk in catalog_io.chunked(catalog_io.read_records(fh, fmt), chunk_size):
+      if columns is None:
+        columns = catalog_io.record_columns(table, chunk[0])
+        if kind == 'shows':
+          # COPY skips column defaults, so every show row carries its end.
+          columns += [ name for name in ('duration_minutes', 'end_date', 'updated_at') if name not in columns ]
+      rows, records = [], []
+      for record in chunk:
+        try:
+          row = catalog_io.to_row(table, columns, record)
+          if kind == 'shows':
+            row['duration_minutes'] = row['duration_minutes'] or DEFAULT_SHOW_MINUTES
+            row['end_date'] = row['end_date'] or row['start_date'] + timedelta(minutes=row['duration_minutes'])
+            row['updated_at'] = row['updated_at'] or datetime.today()
+        except (ValueError, TypeError, OverflowError) as error:
+          skipped += 1
+          click.echo('skipped %r: %s' % (record, error), err=True)
+          continue
+        unresolved = [ name for name, ids in references.items() if row.get(name) not in ids ]
+        if unresolved:
+          skipped += 1
+          click.echo('skipped %r: unknown %s' % (record, ', '.join(unresolved)), err=True)
+          continue
+        rows.append(row)
+        records.append(record)
+      loaded = load(connection, rows, records) if rows else 0
+      skipped += len(rows) - loaded
+      imported += loaded
+      click.echo('%s: %d rows %s, %d skipped' % (kind, imported, 'checked' if dry_run else 'loaded', skipped), err=True)
+
+    if dry_run:
+      transaction.rollback()
+      return
+    if columns and 'id' in columns and db.engine.dialect.name == 'postgresql':
+      # Explicit ids bypass the serial; move it past the highest one.
+      connection.execute(db.text(
+        "SELECT setval(pg_get_serial_sequence('%s', 'id'), COALESCE(MAX(id), 1)) FROM \"%s\"" % (table.name, table.name)))
+    transaction.commit()
+  if kind in ('venues', 'shows'):
+    refresh_all_areas()
+  choice_registry.invalidate('genres')
+  page_cache.clear()
+
+@catalog_cli.command('export')
+@click.argument('kind', type=click.Choice(CATALOG_MODELS))
+@click.argument('output', type=click.File('w'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+  help='Output format; defaults to the OUTPUT file extension.')
+def export_catalog(kind, output, fmt):
+  """Stream every KIND row to OUTPUT ('-' for stdout) as CSV or JSONL.
+
+  Rows are read through a server-side cursor, so the export never holds
+  the whole table in memory. Deleted venues and artists, and their shows,
+  are left out.
+  """
+  table = CATALOG_MODELS[kind].__table__
+  fmt = fmt or catalog_io.file_format(output.name)
+  # A Core select is not filtered by hide_deleted.
+  query = db.select(table).order_by(table.c.id)
+  if 'deleted_at' in table.c:
+    query = query.where(table.c.deleted_at.is_(None))
+  else:
+    query = query.where(db.and_(table.c.venue_id.notin_(deleted_venue_ids), table.c.artist_id.notin_(deleted_artist_ids)))
+  with db.engine.connect() as connection:
+    rows = connection.execution_options(stream_results=True).execute(query)
+    count = catalog_io.write_records(output, fmt, table.columns.keys(), rows)
+  click.echo('%s: %d rows exported' % (kind, count), err=True)
+
+app.cli.add_command(catalog_cli)
+
+areas_cli = AppGroup('areas', help='Maintain the venue area index.')
+
+@areas_cli.command('refresh')
+def refresh_areas_command():
+  """Rebuild the area index from the venue and show tables."""
+  refresh_all_areas()
+  page_cache.invalidate('venues')
+  click.echo('areas: %d rows' % Area.query.count(), err=True)
+
+app.cli.add_command(areas_cli)
+
+purge_cli = AppGroup('purge', help='Remove deleted venues and artists.')
+
+@purge_cli.command('run')
+def purge_run_command():
+  """Purge every deleted venue and artist still waiting, in the foreground.
+
+  For rows whose purge was cut short, e.g. by a restart.
+  """
+  for kind, model, owner_column in (('venue', Venue, 'venue_id'), ('artist', Artist, 'artist_id')):
+    for row_id in deleted_rows(model):
+      total = Show.query.execution_options(include_deleted=True).filter(getattr(Show, owner_column) == row_id).count()
+      job = PurgeJob(kind, row_id, total, purge_step(model, owner_column, row_id))
+      purge_queue.run(job)
+      click.echo('%s %d: %s, %d shows in %d batches%s' % (
+        kind, row_id, job.status, job.purged, job.batches, ' (%s)' % job.error if job.error else ''), err=True)
+
+app.cli.add_command(purge_cli)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,52 @@
+"""Compare building /api/v1 lists in memory with streaming them, all fields vs ?fields=.
+
+  python -m benchmarks.api [shows]
+
+For each variant prints the time to produce the whole body, its size and
+the peak Python memory allocated while doing it.
+"""
+import sys
+import time
+import tracemalloc
+
+from flask import jsonify
+
+from app import app, db, Show, SHOW_API_FIELDS
+from benchmarks.common import setup_database, seed
+
+
+def built_in_memory():
+  # What a plain jsonify view would do: every row as a dict, then one dump.
+  rows = db.session.query(*SHOW_API_FIELDS.values()).join(Show.venue).join(Show.artist
+    ).order_by(Show.start_date.desc(), Show.id.desc()).all()
+  shows = [ dict(zip(SHOW_API_FIELDS, row), start_time=row[3].isoformat(), end_time=row[4].isoformat())
+            for row in rows ]
+  return jsonify(shows=shows, count=len(shows)).get_data()
+
+
+def streamed(path):
+  def run():
+    return b''.join(app.test_client().get(path, buffered=False).response)
+  return run
+
+
+def measure(name, fn):
+  db.session.expunge_all()
+  tracemalloc.start()
+  started = time.perf_counter()
+  body = fn()
+  elapsed = time.perf_counter() - started
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  print('%-36s %9.1f ms %10.1f KB body %10.1f KB peak' % (name, elapsed * 1000, len(body) / 1024, peak / 1024))
+
+
+if __name__ == '__main__':
+  shows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  ctx = setup_database()
+  seed(venues=2000, artists=2000, shows=shows)
+  with app.test_request_context():
+    measure('in memory, all fields', built_in_memory)
+  measure('streamed, all fields', streamed('/api/v1/shows'))
+  measure('streamed, ?fields=id,start_time', streamed('/api/v1/shows?fields=id,start_time'))
+  ctx.pop()
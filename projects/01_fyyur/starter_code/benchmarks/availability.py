@@ -0,0 +1,30 @@
+"""Time availability lookups and booking conflict checks on a large schedule.
+
+  python -m benchmarks.availability [venues] [shows]
+
+Defaults to 2000 venues and a million shows. Each lookup should stay in
+the low milliseconds however many shows are scheduled, since it only
+probes the (venue_id, start_date) / (artist_id, start_date) indexes for
+the venues or artists involved.
+"""
+import sys
+from datetime import datetime, timedelta
+
+from app import Venue, Artist, Show, free_in_area, show_conflicts
+from benchmarks.common import setup_database, seed, report, CITIES
+
+
+if __name__ == '__main__':
+  venues = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  shows = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+  ctx = setup_database()
+  seed(venues=venues, artists=venues, shows=shows, chunk=20000)
+  city, state = CITIES[0]
+  day = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+  evening = day.replace(hour=20)
+
+  report('free venues, whole day', lambda: free_in_area(Venue, Show.venue_id, city, state, day, day + timedelta(days=1)))
+  report('free venues, 20:00-22:00', lambda: free_in_area(Venue, Show.venue_id, city, state, evening, evening + timedelta(hours=2)))
+  report('free artists, 20:00-22:00', lambda: free_in_area(Artist, Show.artist_id, city, state, evening, evening + timedelta(hours=2)))
+  report('booking conflict check', lambda: show_conflicts(1, 1, evening, evening + timedelta(hours=2)))
+  ctx.pop()
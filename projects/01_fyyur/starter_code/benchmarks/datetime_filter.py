@@ -0,0 +1,43 @@
+"""Per-call cost of the ``datetime`` Jinja filter over 100k show timestamps.
+
+  python -m benchmarks.datetime_filter [count]
+
+Needs no database.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def run(name, fn, values):
+  started = time.perf_counter()
+  for value in values:
+    fn(value, 'full')
+  elapsed = time.perf_counter() - started
+  print('%-36s %8.2f s %8.2f us/call' % (name, elapsed, elapsed / len(values) * 1e6))
+
+
+if __name__ == '__main__':
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  start = datetime(2022, 8, 12, 20, 0)
+  dates = [ start + timedelta(minutes=i) for i in range(count) ]
+  strings = [ date.strftime("%m/%d/%Y, %H:%M:%S") for date in dates ]
+
+  assert format_datetime(dates[0], 'full') == legacy_format_datetime(strings[0], 'full')
+  run('legacy (string, reparse)', legacy_format_datetime, strings)
+  run('cached pattern (string)', format_datetime, strings)
+  run('cached pattern (datetime)', format_datetime, dates)
@@ -0,0 +1,38 @@
+"""Per-request cost of building and rendering the create and edit forms.
+
+  python -m benchmarks.forms [repeat]
+
+Times form instantiation alone, then whole GET requests for the create and
+edit pages, with the choice registry warm (the usual case) and cold (as on
+the first request, or when the genre choices' TTL has run out).
+"""
+import sys
+
+from app import app
+from forms import VenueForm, ArtistForm, ShowForm, choice_registry
+from benchmarks.common import setup_database, seed, report
+
+
+def cold(fn):
+  def run():
+    choice_registry.invalidate()
+    fn()
+  return run
+
+
+if __name__ == '__main__':
+  repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+  app.config['WTF_CSRF_ENABLED'] = False
+  ctx = setup_database()
+  seed(venues=1000, artists=1000, shows=5000)
+  client = app.test_client()
+
+  with app.test_request_context('/venues/create'):
+    for name, form in (('VenueForm', VenueForm), ('ArtistForm', ArtistForm), ('ShowForm', ShowForm)):
+      report('%s(), warm' % name, form, repeat)
+      report('%s(), cold' % name, cold(form), repeat)
+
+  for path in ('/venues/create', '/artists/create', '/shows/create', '/venues/1/edit', '/artists/1/edit'):
+    report('GET %s, warm' % path, lambda: client.get(path), repeat)
+    report('GET %s, cold' % path, cold(lambda: client.get(path)), repeat)
+  ctx.pop()
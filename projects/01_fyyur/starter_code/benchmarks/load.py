@@ -0,0 +1,204 @@
+"""Load test every Fyyur route and record per-route latency, throughput and queries.
+
+  python -m benchmarks.load --venues 2000 --artists 2000 --shows 50000 \
+    --concurrency 16 --requests 200 --output bench.json [--baseline old.json]
+
+By default the routes are driven in process through Flask test clients
+against FYYUR_BENCH_DATABASE_URI, which is seeded first (see
+benchmarks/common.py). With --url the requests go over HTTP to a running
+server instead and the catalog sizes only tell the harness which ids exist.
+Query counts come from the X-DB-Queries header, so a remote server must run
+in debug mode for them to be reported, and with WTF_CSRF_ENABLED off for the
+form posts to be accepted.
+
+The JSON written to --output holds p50/p95/p99 latency, throughput, error
+count and mean queries per route, plus the git commit it was run at; pass a
+previous run as --baseline to print the p50 change per route.
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from app import app, page_cache
+from benchmarks.common import setup_database, seed, GENRES
+
+
+def routes(args, rnd):
+  """(name, method, path, form data) for one request to every route."""
+  venue = rnd.randint(1, args.venues)
+  artist = rnd.randint(1, args.artists)
+  venue_form = {
+    'name': 'Bench Venue %d' % rnd.randint(0, 10 ** 9), 'city': 'Austin', 'state': 'TX',
+    'address': '1 Bench St', 'genres': rnd.sample(GENRES, 2), 'phone': '512-555-0100',
+  }
+  artist_form = {
+    'name': 'Bench Artist %d' % rnd.randint(0, 10 ** 9), 'city': 'Austin', 'state': 'TX',
+    'genres': rnd.sample(GENRES, 2), 'phone': '512-555-0101',
+  }
+  show_form = {
+    'venue_id': venue, 'artist_id': artist,
+    'start_time': '2040-%02d-%02d %02d:%02d:%02d' % (
+      rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59)),
+  }
+  return [
+    ('venues', 'GET', '/venues', None),
+    ('artists', 'GET', '/artists', None),
+    ('shows', 'GET', '/shows', None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'Venue %d' % rnd.randint(1, 99)}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'Artist %d' % rnd.randint(1, 99)}),
+    ('show_venue', 'GET', '/venues/%d' % venue, None),
+    ('show_artist', 'GET', '/artists/%d' % artist, None),
+    ('create_venue', 'POST', '/venues/create', venue_form),
+    ('create_artist', 'POST', '/artists/create', artist_form),
+    ('create_show', 'POST', '/shows/create', show_form),
+    ('edit_venue', 'POST', '/venues/%d/edit' % venue, dict(venue_form, name='Venue %d' % venue)),
+    ('edit_artist', 'POST', '/artists/%d/edit' % artist, dict(artist_form, name='Artist %d' % artist)),
+  ]
+
+
+def in_process_sender():
+  client = app.test_client()
+
+  def send(method, path, data):
+    response = client.open(path, method=method, data=data)
+    return response.status_code, response.headers.get('X-DB-Queries')
+  return send
+
+
+def http_sender(base):
+  def send(method, path, data):
+    body = urlencode(data, doseq=True).encode() if data is not None else None
+    try:
+      response = urlopen(Request(base + path, data=body, method=method), timeout=60)
+    except HTTPError as error:
+      return error.code, error.headers.get('X-DB-Queries')
+    return response.status, response.headers.get('X-DB-Queries')
+  return send
+
+
+def worker(args, number, results, lock):
+  rnd = random.Random(args.seed + number)
+  send = http_sender(args.url.rstrip('/')) if args.url else in_process_sender()
+  for _ in range(args.requests):
+    for name, method, path, data in routes(args, rnd):
+      if args.only and name not in args.only:
+        continue
+      started = time.perf_counter()
+      try:
+        status, queries = send(method, path, data)
+      except (URLError, OSError):
+        status, queries = 599, None
+      elapsed = time.perf_counter() - started
+      with lock:
+        result = results[name]
+        result['latencies'].append(elapsed)
+        result['errors'] += status >= 400
+        if queries is not None:
+          result['queries'].append(int(queries))
+
+
+def percentile(values, fraction):
+  return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def summarize(results, wall_seconds):
+  summary = {}
+  for name, result in sorted(results.items()):
+    latencies = sorted(result['latencies'])
+    summary[name] = {
+      'requests': len(latencies),
+      'errors': result['errors'],
+      'throughput_rps': round(len(latencies) / wall_seconds, 2),
+      'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+      'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+      'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+      'queries_avg': round(sum(result['queries']) / len(result['queries']), 2) if result['queries'] else None,
+    }
+  return summary
+
+
+def git_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def print_report(summary, baseline=None):
+  print('%-16s %8s %6s %9s %9s %9s %9s %8s' % (
+    'route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+  for name, row in summary.items():
+    line = '%-16s %8d %6d %9.1f %9.2f %9.2f %9.2f %8s' % (
+      name, row['requests'], row['errors'], row['throughput_rps'],
+      row['p50_ms'], row['p95_ms'], row['p99_ms'], row['queries_avg'])
+    previous = (baseline or {}).get(name)
+    if previous and previous['p50_ms']:
+      line += '   p50 %+.1f%%' % ((row['p50_ms'] / previous['p50_ms'] - 1) * 100)
+    print(line)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=1000)
+  parser.add_argument('--shows', type=int, default=20000)
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--requests', type=int, default=50, help='rounds over every route, per worker')
+  parser.add_argument('--only', nargs='*', help='route names to drive (default: all)')
+  parser.add_argument('--cache', action='store_true', help='keep the page cache on')
+  parser.add_argument('--no-seed', action='store_true', help='reuse the catalog already in the database')
+  parser.add_argument('--url', help='drive a running server instead of the app in process')
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--output', default='bench.json')
+  parser.add_argument('--baseline', help='earlier --output file to compare against')
+  args = parser.parse_args()
+
+  ctx = None
+  if not args.url:
+    # Debug mode adds the X-DB-Queries header; failing views should count as
+    # 500s rather than raise into the worker threads.
+    app.debug = True
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    # The harness posts forms without a CSRF token.
+    app.config['WTF_CSRF_ENABLED'] = False
+    page_cache.enabled = args.cache
+    ctx = setup_database(recreate=not args.no_seed)
+    if not args.no_seed:
+      seed(venues=args.venues, artists=args.artists, shows=args.shows, seed_value=args.seed)
+
+  results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'queries': []})
+  lock = threading.Lock()
+  threads = [ threading.Thread(target=worker, args=(args, number, results, lock))
+              for number in range(args.concurrency) ]
+  started = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  summary = summarize(results, time.perf_counter() - started)
+
+  report = {
+    'commit': git_commit(),
+    'config': { key: getattr(args, key) for key in ('venues', 'artists', 'shows', 'concurrency', 'requests', 'cache', 'url') },
+    'routes': summary,
+  }
+  with open(args.output, 'w') as fh:
+    json.dump(report, fh, indent=2)
+  baseline = None
+  if args.baseline:
+    with open(args.baseline) as fh:
+      baseline = json.load(fh)['routes']
+  print_report(summary, baseline)
+  if ctx is not None:
+    ctx.pop()
+
+
+if __name__ == '__main__':
+  main()
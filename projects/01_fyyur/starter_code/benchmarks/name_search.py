@@ -0,0 +1,19 @@
+"""Latency of ranked name search and prefix suggestions at catalog scale.
+
+  python -m benchmarks.name_search [rows]
+"""
+import sys
+
+from app import Venue, search_by_name, suggest_names
+from benchmarks.common import setup_database, seed, report
+
+
+if __name__ == '__main__':
+  rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  ctx = setup_database()
+  seed(venues=rows, artists=1, shows=0)
+  for term in ('Venue 4242', 'ue 99', 'Venue 1'):
+    report('search %r' % term, lambda: search_by_name(Venue, term))
+  for prefix in ('V', 'Venue 12', 'Venue 123456'):
+    report('suggest %r' % prefix, lambda: suggest_names(Venue, prefix))
+  ctx.pop()
@@ -0,0 +1,61 @@
+"""Drive a running Fyyur server at rising concurrency and watch the pool saturate.
+
+Start the app under gunicorn with a deliberately small pool, e.g.
+
+  FYYUR_DB_POOL_SIZE=2 FYYUR_DB_MAX_OVERFLOW=0 FYYUR_DB_POOL_TIMEOUT=5 \
+    gunicorn -w 4 --threads 8 app:app
+
+then run
+
+  python -m benchmarks.pool_saturation http://localhost:8000 /venues/1 [seconds]
+
+Each step reports throughput, latency percentiles and errors, followed by the
+/admin/pool snapshot of whichever worker answered it. Once concurrency passes
+workers * (pool_size + max_overflow), checkout waits, then timeouts, climb.
+"""
+import json
+import sys
+import threading
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+CONCURRENCY_STEPS = (1, 4, 8, 16, 32, 64, 128)
+
+
+def hammer(url, seconds, latencies, errors):
+  deadline = time.monotonic() + seconds
+  while time.monotonic() < deadline:
+    started = time.perf_counter()
+    try:
+      urlopen(url, timeout=60).read()
+      latencies.append(time.perf_counter() - started)
+    except (URLError, OSError):
+      errors.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def step(base, path, concurrency, seconds):
+  latencies, errors = [], []
+  threads = [ threading.Thread(target=hammer, args=(base + path, seconds, latencies, errors))
+              for _ in range(concurrency) ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  pool = json.loads(urlopen(base + '/admin/pool').read())
+  print('c=%-4d %8.1f req/s  p50 %7.1f ms  p99 %7.1f ms  errors %-5d  wait max %8.1f ms  timeouts %d' % (
+    concurrency, len(latencies) / seconds, percentile(latencies, 0.5) * 1000,
+    percentile(latencies, 0.99) * 1000, len(errors), pool['wait_max_ms'], pool['timeouts']))
+
+
+if __name__ == '__main__':
+  base = sys.argv[1].rstrip('/') if len(sys.argv) > 1 else 'http://localhost:8000'
+  path = sys.argv[2] if len(sys.argv) > 2 else '/venues/1'
+  seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+  for concurrency in CONCURRENCY_STEPS:
+    step(base, path, concurrency, seconds)
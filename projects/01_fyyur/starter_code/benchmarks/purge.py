@@ -0,0 +1,53 @@
+"""Time deleting a venue with a long history: cascade delete vs soft delete and purge.
+
+  python -m benchmarks.purge [shows per venue] [purge batch size]
+
+Two venues get 100000 shows each by default. The first is deleted the way
+the route used to, loading its shows into the session and cascading; the
+second through the delete route, which only marks it deleted and leaves
+its shows to the purge queue. Reports the request time of both and how
+long the purge took in the background.
+"""
+import sys
+import time
+
+from app import app, db, Venue, Show, purge_queue, venue_cache_groups
+from benchmarks.common import setup_database, seed, count_queries
+
+
+def cascade_delete(venue_id):
+  venue = Venue.query.get(venue_id)
+  venue_cache_groups(venue_id)
+  db.session.delete(venue)
+  db.session.commit()
+
+
+if __name__ == '__main__':
+  shows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+  ctx = setup_database()
+  seed(venues=100, artists=1000, shows=shows * 2 + 10000, chunk=20000)
+  # Seeded shows are a minute apart, so moving them keeps every slot unique.
+  db.session.execute(db.update(Show.__table__).where(Show.__table__.c.id <= shows).values(venue_id=1))
+  db.session.execute(db.update(Show.__table__).where(Show.__table__.c.id.between(shows + 1, shows * 2)).values(venue_id=2))
+  db.session.commit()
+
+  with count_queries() as stats:
+    started = time.perf_counter()
+    cascade_delete(1)
+    elapsed = time.perf_counter() - started
+  print('%-24s %10.2f ms %8d queries' % ('cascade delete', elapsed * 1000, stats['queries']))
+
+  purge_queue.batch_size = batch_size
+  client = app.test_client()
+  with count_queries() as stats:
+    started = time.perf_counter()
+    client.get('/venues/delete/2')
+    elapsed = time.perf_counter() - started
+  print('%-24s %10.2f ms %8d queries' % ('soft delete request', elapsed * 1000, stats['queries']))
+  purge_queue.join()
+  job = purge_queue.jobs()[-1]
+  print('%-24s %10.2f ms %8d batches  %d shows' % (
+    'background purge', (job.finished_at - job.queued_at) * 1000, job.batches, job.purged))
+  purge_queue.close()
+  ctx.pop()
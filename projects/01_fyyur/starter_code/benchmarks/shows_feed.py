@@ -0,0 +1,30 @@
+"""/shows page latency near the start and deep into the history, keyset vs OFFSET.
+
+  python -m benchmarks.shows_feed [shows]
+"""
+import sys
+
+from app import db, Show, SHOWS_PER_PAGE, shows_feed, encode_cursor
+from benchmarks.common import setup_database, seed, report
+
+
+def offset_page(offset):
+  return Show.query.order_by(Show.start_date.desc(), Show.id.desc()
+    ).offset(offset).limit(SHOWS_PER_PAGE).all()
+
+
+def cursor_at(offset):
+  show = db.session.query(Show.start_date, Show.id
+    ).order_by(Show.start_date.desc(), Show.id.desc()).offset(offset).first()
+  return encode_cursor(show.start_date, show.id)
+
+
+if __name__ == '__main__':
+  shows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  ctx = setup_database()
+  seed(venues=1000, artists=1000, shows=shows)
+  for depth in (0, shows // 10, shows // 2, shows - 2 * SHOWS_PER_PAGE):
+    cursor = cursor_at(depth) if depth else None
+    report('keyset page at %d' % depth, lambda: shows_feed(cursor))
+    report('offset page at %d' % depth, lambda: offset_page(depth))
+  ctx.pop()
@@ -0,0 +1,31 @@
+"""Compare the per-venue counting loop, the grouped query and the area index behind /venues.
+
+  python -m benchmarks.venues_listing [venues]
+"""
+import sys
+from datetime import datetime
+
+from app import Venue, Show, venue_areas, area_index, area_venues_page
+from benchmarks.common import setup_database, seed, report
+
+
+def legacy_venue_areas():
+  venues_dict = {}
+  for row in Venue.query.all():
+    venues_dict.setdefault((row.city, row.state), []).append(dict(
+      id=row.id,
+      name=row.name,
+      upcoming_shows=Show.query.filter(Show.venue_id == row.id, Show.start_date > datetime.today()).count()
+    ))
+  return [ dict(city=k[0], state=k[1], venues=v) for k, v in venues_dict.items() ]
+
+
+if __name__ == '__main__':
+  venues = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  ctx = setup_database()
+  seed(venues=venues, artists=venues // 2, shows=venues * 5)
+  report('per-venue count (legacy)', legacy_venue_areas, repeat=1)
+  report('grouped query', venue_areas)
+  report('area index (landing page)', area_index)
+  report('one area, first page', lambda: area_venues_page('Austin', 'TX'))
+  ctx.pop()
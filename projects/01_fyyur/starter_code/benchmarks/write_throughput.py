@@ -0,0 +1,82 @@
+"""Compare write throughput of per-request commits with the write pipeline.
+
+  python -m benchmarks.write_throughput [writers] [writes per writer]
+
+Every writer thread inserts artists as fast as it can, first the way the
+handlers used to (build the row and commit it in the request's own session
+and connection), then through the write pipeline, which commits whatever
+has queued up as one transaction. Reports writes per second, latency
+percentiles, commits issued and connections used for both.
+"""
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+
+from app import app, db, write_pipeline, insert_artist, pool_metrics
+from benchmarks.common import setup_database, seed, count_queries
+
+
+def artist(writer, number):
+  return dict(name='Writer %d Artist %d' % (writer, number), city='Austin', state='TX', genres=['Jazz'])
+
+
+def per_request_commit(writer, number):
+  with app.app_context():
+    insert_artist(artist(writer, number))
+    db.session.commit()
+    db.session.remove()
+
+
+def pipelined(writer, number):
+  submission = write_pipeline.submit('artist', lambda: insert_artist(artist(writer, number)))
+  submission.wait()
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def run(name, write, writers, writes):
+  latencies = []
+  lock = threading.Lock()
+
+  def writer(number):
+    for i in range(writes):
+      started = time.perf_counter()
+      write(number, i)
+      with lock:
+        latencies.append(time.perf_counter() - started)
+
+  threads = [ threading.Thread(target=writer, args=(number,)) for number in range(writers) ]
+  commits = {'count': 0}
+
+  def count_commit(conn):
+    commits['count'] += 1
+
+  event.listen(db.engine, 'commit', count_commit)
+  checkouts = pool_metrics.checkouts
+  started = time.perf_counter()
+  with count_queries() as stats:
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+  elapsed = time.perf_counter() - started
+  event.remove(db.engine, 'commit', count_commit)
+  print('%-24s %9.1f writes/s  p50 %7.2f ms  p99 %7.2f ms  %6d commits  %6d queries  %6d checkouts' % (
+    name, len(latencies) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+    commits['count'], stats['queries'], pool_metrics.checkouts - checkouts))
+
+
+if __name__ == '__main__':
+  writers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+  writes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+  ctx = setup_database()
+  seed(venues=100, artists=100, shows=1000)
+  run('per-request commit', per_request_commit, writers, writes)
+  run('write pipeline', pipelined, writers, writes)
+  write_pipeline.close()
+  ctx.pop()
@@ -0,0 +1,318 @@
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+#
+# Rendered read pages are cached per entity: every page is stored under a
+# group such as 'venues', 'venue:3' or 'artist:7', and a write invalidates
+# the groups it touched. One group can hold several pages (?past_page=2,
+# ?cursor=...), so invalidating a group drops all of them.
+#
+# Backends share a small interface so the store can be swapped through
+# config: LRUBackend keeps pages in process, RedisBackend talks to anything
+# with the redis-py surface it uses (a real redis.Redis or FakeRedis below).
+#
+# In front of that, conditional() lets clients revalidate: pages carry an
+# ETag derived from a cheap version query, and a matching If-None-Match is
+# answered 304 before the page is rendered or even looked up. Below a
+# conditional() the ETag is part of the cache key, so a page cached under
+# an older version (written by another process, or by a read racing a
+# write) is never served with the current ETag.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+
+
+class LRUBackend:
+  """In-process store holding at most ``max_entries`` pages.
+
+  A page leaves its group whenever it leaves the store (evicted, expired or
+  replaced), so the groups never hold more keys than the store does.
+  """
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._groups = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      value, expires, group = entry
+      if expires is not None and expires < time.monotonic():
+        self._discard(key)
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl=None, group=None):
+    expires = time.monotonic() + ttl if ttl else None
+    with self._lock:
+      self._discard(key)
+      self._entries[key] = (value, expires, group)
+      if group is not None:
+        self._groups.setdefault(group, set()).add(key)
+      while len(self._entries) > self.max_entries:
+        self._discard(next(iter(self._entries)))
+
+  def invalidate(self, groups):
+    with self._lock:
+      for group in groups:
+        for key in self._groups.pop(group, ()):
+          self._entries.pop(key, None)
+
+  def _discard(self, key):
+    entry = self._entries.pop(key, None)
+    if entry is None or entry[2] is None:
+      return
+    keys = self._groups.get(entry[2])
+    if keys is not None:
+      keys.discard(key)
+      if not keys:
+        del self._groups[entry[2]]
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._groups.clear()
+
+
+class RedisBackend:
+  """Store pages in Redis; groups are Redis sets of page keys.
+
+  A group set expires along with the page most recently added to it, so
+  with one TTL for every page (as PageCache uses) it outlives its members
+  and is gone once they all are. Keys of pages that expired earlier stay
+  in the set until then.
+  """
+
+  def __init__(self, client, prefix='fyyur:page:'):
+    self.client = client
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return value.decode() if isinstance(value, bytes) else value
+
+  def set(self, key, value, ttl=None, group=None):
+    pipe = self.client.pipeline()
+    if ttl:
+      pipe.setex(self.prefix + key, ttl, value)
+    else:
+      pipe.set(self.prefix + key, value)
+    if group is not None:
+      group_key = self.prefix + 'group:' + group
+      pipe.sadd(group_key, self.prefix + key)
+      if ttl:
+        pipe.expire(group_key, ttl)
+      else:
+        pipe.persist(group_key)
+    pipe.execute()
+
+  def invalidate(self, groups):
+    for group in groups:
+      group_key = self.prefix + 'group:' + group
+      keys = self.client.smembers(group_key)
+      self.client.delete(group_key, *keys)
+
+  def clear(self):
+    keys = self.client.keys(self.prefix + '*')
+    if keys:
+      self.client.delete(*keys)
+
+
+class FakeRedis:
+  """Just enough of the redis-py client for RedisBackend, kept in memory.
+
+  Lets the Redis code path run in development and tests without a server.
+  """
+
+  def __init__(self):
+    self._data = {}
+    self._lock = threading.Lock()
+
+  def _live(self, key):
+    value, expires = self._data.get(key, (None, None))
+    if expires is not None and expires < time.monotonic():
+      del self._data[key]
+      return None
+    return value
+
+  def get(self, key):
+    with self._lock:
+      value = self._live(key)
+      return value.encode() if isinstance(value, str) else value
+
+  def set(self, key, value):
+    with self._lock:
+      self._data[key] = (value, None)
+
+  def setex(self, key, ttl, value):
+    with self._lock:
+      self._data[key] = (value, time.monotonic() + ttl)
+
+  def sadd(self, key, *members):
+    with self._lock:
+      self._data.setdefault(key, (set(), None))[0].update(members)
+
+  def expire(self, key, ttl):
+    with self._lock:
+      if self._live(key) is None:
+        return False
+      self._data[key] = (self._data[key][0], time.monotonic() + ttl)
+      return True
+
+  def persist(self, key):
+    with self._lock:
+      if self._live(key) is None:
+        return False
+      self._data[key] = (self._data[key][0], None)
+      return True
+
+  def smembers(self, key):
+    with self._lock:
+      return set(self._live(key) or ())
+
+  def delete(self, *keys):
+    with self._lock:
+      return sum(self._data.pop(key, None) is not None for key in keys)
+
+  def keys(self, pattern='*'):
+    prefix = pattern.rstrip('*')
+    with self._lock:
+      return [ key for key in list(self._data) if key.startswith(prefix) and self._live(key) is not None ]
+
+  def pipeline(self):
+    return _FakePipeline(self)
+
+
+class _FakePipeline:
+
+  def __init__(self, client):
+    self.client = client
+    self.calls = []
+
+  def __getattr__(self, name):
+    method = getattr(self.client, name)
+    return lambda *args: self.calls.append((method, args))
+
+  def execute(self):
+    calls, self.calls = self.calls, []
+    return [ method(*args) for method, args in calls ]
+
+
+class PageCache:
+  """Caches the rendered output of read views and counts hits and misses."""
+
+  def __init__(self, backend=None, ttl=300):
+    self.backend = backend or LRUBackend()
+    self.ttl = ttl
+    self.enabled = True
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+    self._lock = threading.Lock()
+
+  def cached(self, group):
+    """Decorate a view whose page belongs to ``group``.
+
+    ``group`` is a string, or a callable taking the view arguments and
+    returning one ('venue:%d' % venue_id). Requests carrying flashed
+    messages bypass the cache since those are rendered into the page.
+    Under conditional(), pages are keyed by the ETag they are sent with.
+    """
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        if not self.enabled or request.method != 'GET' or session.get('_flashes'):
+          return view(*args, **kwargs)
+        name = group(*args, **kwargs) if callable(group) else group
+        key = name + '|' + request.full_path
+        if g.get('page_etag'):
+          key += '|' + g.page_etag
+        page = self.backend.get(key)
+        with self._lock:
+          if page is not None:
+            self.hits += 1
+          else:
+            self.misses += 1
+        if page is not None:
+          return page
+        page = view(*args, **kwargs)
+        if isinstance(page, str):
+          self.backend.set(key, page, self.ttl, group=name)
+        return page
+      return wrapper
+    return decorator
+
+  def invalidate(self, *groups):
+    with self._lock:
+      self.invalidations += 1
+    self.backend.invalidate(groups)
+
+  def clear(self):
+    self.backend.clear()
+    with self._lock:
+      self.hits = self.misses = self.invalidations = 0
+
+  def stats(self):
+    with self._lock:
+      hits, misses, invalidations = self.hits, self.misses, self.invalidations
+    lookups = hits + misses
+    return {
+      'backend': type(self.backend).__name__,
+      'hits': hits,
+      'misses': misses,
+      'invalidations': invalidations,
+      'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def conditional(version):
+  """Decorate a GET view so unchanged pages are answered with 304.
+
+  ``version`` takes the view arguments and returns a token that changes
+  whenever the page would (counts and latest updated_at values from one
+  small query), or None to skip the check, e.g. for a missing row the view
+  will 404 on. The ETag is a hash of the token and the full path, so each
+  page of a paginated view has its own.
+  """
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      # Flashed messages are rendered into the page, so those responses are
+      # neither revalidated nor tagged.
+      if request.method != 'GET' or session.get('_flashes'):
+        return view(*args, **kwargs)
+      token = version(*args, **kwargs)
+      if token is None:
+        return view(*args, **kwargs)
+      etag = hashlib.sha1(repr((request.full_path, token)).encode()).hexdigest()
+      g.page_etag = etag
+      if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+      else:
+        response = make_response(view(*args, **kwargs))
+      response.set_etag(etag)
+      response.headers['Cache-Control'] = 'no-cache'
+      return response
+    return wrapper
+  return decorator
+
+
+def backend_from_config(config):
+  """Build the backend named by CACHE_BACKEND ('lru', 'redis' or 'fakeredis')."""
+  kind = config.get('CACHE_BACKEND', 'lru')
+  if kind == 'redis':
+    import redis
+    return RedisBackend(redis.Redis.from_url(config['CACHE_REDIS_URL']))
+  if kind == 'fakeredis':
+    return RedisBackend(FakeRedis())
+  return LRUBackend(config.get('CACHE_MAX_ENTRIES', 1024))
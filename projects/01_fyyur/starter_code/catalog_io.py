@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------------#
+# Catalog import/export.
+#----------------------------------------------------------------------------#
+#
+# Streaming helpers behind the `flask catalog` commands in app.py. Files are
+# read and written one record at a time and loaded in fixed-size chunks, so
+# memory stays flat however large the file is. CSV list values (genres) are
+# '|' separated; JSONL files carry them as JSON arrays.
+
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+import dateutil.parser
+from sqlalchemy import ARRAY, Boolean, DateTime, Integer
+
+LIST_SEPARATOR = '|'
+TRUE_STRINGS = ('1', 'true', 't', 'yes', 'y')
+
+
+def file_format(path):
+  if path.endswith('.jsonl') or path.endswith('.ndjson'):
+    return 'jsonl'
+  if path.endswith('.csv'):
+    return 'csv'
+  raise ValueError('%s: expected a .csv or .jsonl file' % path)
+
+
+def read_records(fh, fmt):
+  """Yield one dict per CSV row or JSONL line."""
+  if fmt == 'csv':
+    yield from csv.DictReader(fh)
+    return
+  for line in fh:
+    if line.strip():
+      yield json.loads(line)
+
+
+def chunked(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def coerce(column, value):
+  """Convert a raw file value to what ``column`` stores; '' and None are NULL."""
+  if value is None or value == '':
+    return None
+  if isinstance(column.type, ARRAY):
+    if isinstance(value, str):
+      return [ item.strip() for item in value.split(LIST_SEPARATOR) if item.strip() ]
+    return list(value)
+  if isinstance(column.type, Boolean):
+    return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_STRINGS
+  if isinstance(column.type, Integer):
+    return int(value)
+  if isinstance(column.type, DateTime):
+    return value if isinstance(value, datetime) else dateutil.parser.parse(value)
+  return value
+
+
+def record_columns(table, record):
+  """The ``table`` column names present in ``record``, in table order."""
+  return [ column.name for column in table.columns if column.name in record ]
+
+
+def to_row(table, columns, record):
+  """Map a file record onto ``columns`` of ``table``; missing values are NULL."""
+  return { name: coerce(table.columns[name], record.get(name)) for name in columns }
+
+
+def copy_rows(connection, table, columns, rows):
+  """Load ``rows`` with Postgres COPY; only for scalar (non-array) columns."""
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for row in rows:
+    writer.writerow([ '' if row.get(name) is None else row[name] for name in columns ])
+  buffer.seek(0)
+  cursor = connection.connection.cursor()
+  cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (
+    table.name, ', '.join('"%s"' % name for name in columns)), buffer)
+
+
+def write_records(fh, fmt, columns, rows):
+  """Stream ``rows`` (tuples in ``columns`` order) to ``fh``; returns the count."""
+  count = 0
+  if fmt == 'csv':
+    writer = csv.writer(fh)
+    writer.writerow(columns)
+  for row in rows:
+    if fmt == 'csv':
+      writer.writerow([ export_value(value, flatten_lists=True) for value in row ])
+    else:
+      fh.write(json.dumps({ name: export_value(value) for name, value in zip(columns, row) }) + '\n')
+    count += 1
+  return count
+
+
+def export_value(value, flatten_lists=False):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if flatten_lists and isinstance(value, list):
+    return LIST_SEPARATOR.join(value)
+  return value
@@ -7,12 +7,18 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python test_app.py -v", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(output='bench.json', baseline=''):
+    """Run the load benchmark; pass baseline=<earlier json> to compare."""
+    local("python -m benchmarks.load --output {}{}".format(
+        output, " --baseline {}".format(baseline) if baseline else ""))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -40,7 +46,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python test_app.py -v"
     )
 
 
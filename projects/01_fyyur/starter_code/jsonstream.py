@@ -0,0 +1,73 @@
+#----------------------------------------------------------------------------#
+# Streaming JSON.
+#----------------------------------------------------------------------------#
+#
+# Helpers behind the /api/v1 routes in app.py. List endpoints hand rows
+# straight from a server-side cursor to stream_document(), which encodes
+# them a chunk at a time, so a response never holds the whole list in
+# memory and the first bytes go out before the last row is read.
+
+import json
+from datetime import date, datetime
+
+CHUNK_ROWS = 500
+
+
+class FieldError(ValueError):
+  """A ?fields= entry names a field the endpoint does not have."""
+
+
+def parse_fields(raw, available, default=None):
+  """The fields named in a ``?fields=id,name`` value, in the order given.
+
+  ``available`` is the endpoint's field names; an empty or missing value
+  selects ``default`` (all of them when None). Unknown names raise
+  FieldError.
+  """
+  if not raw:
+    return list(default if default is not None else available)
+  fields = []
+  for name in raw.split(','):
+    name = name.strip()
+    if not name:
+      continue
+    if name not in available:
+      raise FieldError('unknown field %r; choose from %s' % (name, ', '.join(available)))
+    if name not in fields:
+      fields.append(name)
+  return fields
+
+
+def default(value):
+  if isinstance(value, (datetime, date)):
+    return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+
+encoder = json.JSONEncoder(default=default, separators=(',', ':'), ensure_ascii=False)
+
+
+def dumps(value):
+  return encoder.encode(value)
+
+
+def stream_document(key, rows, fields, extra=None, chunk_rows=CHUNK_ROWS):
+  """Yield ``{"<key>": [{field: value, ...}, ...], "count": n, ...extra}`` in pieces.
+
+  ``rows`` are tuples in ``fields`` order. Rows are encoded ``chunk_rows``
+  at a time; the count is only known at the end, so it follows the list.
+  """
+  yield '{%s:[' % encoder.encode(key)
+  count = 0
+  chunk = []
+  for row in rows:
+    chunk.append(encoder.encode(dict(zip(fields, row))))
+    if len(chunk) >= chunk_rows:
+      yield (',' if count else '') + ','.join(chunk)
+      count += len(chunk)
+      chunk = []
+  if chunk:
+    yield (',' if count else '') + ','.join(chunk)
+    count += len(chunk)
+  tail = dict(extra or {}, count=count)
+  yield '],' + encoder.encode(tail)[1:]
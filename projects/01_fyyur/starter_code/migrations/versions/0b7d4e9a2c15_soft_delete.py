@@ -0,0 +1,28 @@
+"""deleted_at on venues and artists, for soft deletes
+
+Revision ID: 0b7d4e9a2c15
+Revises: f3a61d08b9c4
+Create Date: 2026-10-18 19:14:27.306951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d4e9a2c15'
+down_revision = 'f3a61d08b9c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_%s_deleted_at' % table, table, ['deleted_at'], unique=False)
+
+
+def downgrade():
+    for table in ('venue', 'artist'):
+        op.drop_index('ix_%s_deleted_at' % table, table_name=table)
+        op.drop_column(table, 'deleted_at')
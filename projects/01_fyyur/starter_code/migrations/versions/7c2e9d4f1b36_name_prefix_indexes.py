@@ -0,0 +1,30 @@
+"""lower(name) indexes for name prefix search and suggestions
+
+Revision ID: 7c2e9d4f1b36
+Revises: 0b7d4e9a2c15
+Create Date: 2026-10-19 10:04:27.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9d4f1b36'
+down_revision = '0b7d4e9a2c15'
+branch_labels = None
+depends_on = None
+
+# COLLATE "C" rather than text_pattern_ops: both serve LIKE 'prefix%', but
+# only an index in the default operator class can also return the rows in
+# ORDER BY order.
+
+
+def upgrade():
+    op.execute('CREATE INDEX ix_venue_name_lower ON venue (lower(name) COLLATE "C")')
+    op.execute('CREATE INDEX ix_artist_name_lower ON artist (lower(name) COLLATE "C")')
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_lower', table_name='artist')
+    op.drop_index('ix_venue_name_lower', table_name='venue')
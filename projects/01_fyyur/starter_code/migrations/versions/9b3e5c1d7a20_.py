@@ -0,0 +1,33 @@
+"""show lookup indexes and per-venue slot uniqueness
+
+Revision ID: 9b3e5c1d7a20
+Revises: 6f1d2a9c4b7e
+Create Date: 2026-10-18 10:03:17.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5c1d7a20'
+down_revision = '6f1d2a9c4b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A single global UNIQUE(start_date) let only one show start at any
+    # instant across all venues; a venue can only host one show per slot.
+    # The constraint's (venue_id, start_date) index also serves venue pages.
+    op.drop_constraint('show_start_date_key', 'show', type_='unique')
+    op.create_unique_constraint('uq_show_venue_slot', 'show', ['venue_id', 'start_date'])
+    op.create_index('ix_show_artist_id_start_date', 'show', ['artist_id', 'start_date'], unique=False)
+    op.create_index('ix_show_start_date_id', 'show', ['start_date', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_date_id', table_name='show')
+    op.drop_index('ix_show_artist_id_start_date', table_name='show')
+    op.drop_constraint('uq_show_venue_slot', 'show', type_='unique')
+    op.create_unique_constraint('show_start_date_key', 'show', ['start_date'])
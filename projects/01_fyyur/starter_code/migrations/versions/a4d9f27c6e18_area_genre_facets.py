@@ -0,0 +1,41 @@
+"""Area genre index: venues per genre per city and state
+
+Revision ID: a4d9f27c6e18
+Revises: 7c2e9d4f1b36
+Create Date: 2026-10-20 09:41:12.305517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d9f27c6e18'
+down_revision = '7c2e9d4f1b36'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+INSERT INTO area_genre (city, state, genre, venue_count)
+SELECT tags.city, tags.state, tags.genre, count(*)
+FROM (SELECT venue.city, venue.state, unnest(venue.genres) AS genre
+      FROM venue WHERE venue.deleted_at IS NULL) AS tags
+GROUP BY tags.state, tags.city, tags.genre
+"""
+
+
+def upgrade():
+    op.create_table('area_genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('genre', sa.String(), nullable=False),
+    sa.Column('venue_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('state', 'city', 'genre', name='uq_area_genre_state_city_genre')
+    )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('area_genre')
@@ -0,0 +1,42 @@
+"""GIN indexes for genre filtering, with genre clean-up
+
+Revision ID: c4a8e2f61d93
+Revises: 9b3e5c1d7a20
+Create Date: 2026-10-18 13:40:52.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f61d93'
+down_revision = '9b3e5c1d7a20'
+branch_labels = None
+depends_on = None
+
+# Trim every genre, drop blanks and duplicates, keep first-seen order, so
+# that containment filters and facet counts see one spelling per genre.
+BACKFILL = """
+UPDATE {table} SET genres = ARRAY(
+    SELECT genre FROM (
+        SELECT btrim(genre) AS genre, min(position) AS position
+        FROM unnest({table}.genres) WITH ORDINALITY AS tags(genre, position)
+        WHERE btrim(genre) <> ''
+        GROUP BY btrim(genre)
+    ) AS cleaned
+    ORDER BY position
+)
+"""
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.execute(BACKFILL.format(table=table))
+    op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='artist')
+    op.drop_index('ix_venue_genres', table_name='venue')
@@ -0,0 +1,45 @@
+"""Area index: venue and upcoming show counts per city and state
+
+Revision ID: d71f3b0a5c28
+Revises: c4a8e2f61d93
+Create Date: 2026-10-18 15:02:37.418906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71f3b0a5c28'
+down_revision = 'c4a8e2f61d93'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+INSERT INTO area (city, state, venue_count, upcoming_shows, stale_after, refreshed_at)
+SELECT venue.city, venue.state, count(DISTINCT venue.id), count(show.id), min(show.start_date), now()
+FROM venue
+LEFT OUTER JOIN show ON show.venue_id = venue.id AND show.start_date > now()
+GROUP BY venue.state, venue.city
+"""
+
+
+def upgrade():
+    op.create_table('area',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('venue_count', sa.Integer(), nullable=False),
+    sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+    sa.Column('stale_after', sa.DateTime(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('state', 'city', name='uq_area_state_city')
+    )
+    op.create_index('ix_venue_state_city_name', 'venue', ['state', 'city', 'name'], unique=False)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city_name', table_name='venue')
+    op.drop_table('area')
@@ -0,0 +1,57 @@
+"""Show durations, with exclusion constraints against double bookings
+
+Revision ID: e5b92c47f1a0
+Revises: d71f3b0a5c28
+Create Date: 2026-10-18 16:21:09.730154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b92c47f1a0'
+down_revision = 'd71f3b0a5c28'
+branch_labels = None
+depends_on = None
+
+# Existing shows get the default two hours, cut short where the same venue
+# or artist has a later show sooner than that. Two shows by one artist
+# starting within the same minute still overlap and make the artist
+# constraint fail; resolve those bookings before upgrading.
+BACKFILL = """
+UPDATE show SET duration_minutes = fitted.minutes,
+                end_date = show.start_date + fitted.minutes * interval '1 minute'
+FROM (
+    SELECT id, GREATEST(1, floor(LEAST(
+        120,
+        COALESCE(extract(epoch FROM lead(start_date) OVER (PARTITION BY venue_id ORDER BY start_date) - start_date) / 60, 120),
+        COALESCE(extract(epoch FROM lead(start_date) OVER (PARTITION BY artist_id ORDER BY start_date) - start_date) / 60, 120)
+    )))::integer AS minutes
+    FROM show
+) AS fitted
+WHERE show.id = fitted.id
+"""
+
+
+def upgrade():
+    op.add_column('show', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    op.add_column('show', sa.Column('end_date', sa.DateTime(), nullable=True))
+    op.execute(BACKFILL)
+    op.alter_column('show', 'end_date', nullable=False)
+    op.create_check_constraint('ck_show_duration', 'show', 'duration_minutes BETWEEN 1 AND 720')
+    op.create_index('ix_artist_state_city_name', 'artist', ['state', 'city', 'name'], unique=False)
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute('ALTER TABLE show ADD CONSTRAINT ex_show_venue_overlap '
+               'EXCLUDE USING gist (venue_id WITH =, tsrange(start_date, end_date) WITH &&)')
+    op.execute('ALTER TABLE show ADD CONSTRAINT ex_show_artist_overlap '
+               'EXCLUDE USING gist (artist_id WITH =, tsrange(start_date, end_date) WITH &&)')
+
+
+def downgrade():
+    op.drop_constraint('ex_show_artist_overlap', 'show')
+    op.drop_constraint('ex_show_venue_overlap', 'show')
+    op.drop_index('ix_artist_state_city_name', table_name='artist')
+    op.drop_constraint('ck_show_duration', 'show', type_='check')
+    op.drop_column('show', 'end_date')
+    op.drop_column('show', 'duration_minutes')
@@ -0,0 +1,32 @@
+"""updated_at on venues, artists and shows, for conditional GETs
+
+Revision ID: f3a61d08b9c4
+Revises: e5b92c47f1a0
+Create Date: 2026-10-18 18:02:44.518307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a61d08b9c4'
+down_revision = 'e5b92c47f1a0'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist', 'show')
+
+
+def upgrade():
+    # Existing rows start at the epoch; the app sets the column from then on.
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default='1970-01-01', nullable=False))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index('ix_%s_updated_at' % table, table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_%s_updated_at' % table, table_name=table)
+        op.drop_column(table, 'updated_at')
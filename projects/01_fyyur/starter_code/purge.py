@@ -0,0 +1,153 @@
+#----------------------------------------------------------------------------#
+# Background purge.
+#----------------------------------------------------------------------------#
+#
+# Deleting a venue or an artist only marks it deleted, which hides it and
+# its shows at once. A PurgeQueue worker then removes the shows for real,
+# ``batch_size`` rows per transaction, and finally the row itself, so no
+# request waits on (or holds locks for) a long cascade. Each job reports
+# how far it has got.
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+log = logging.getLogger('fyyur.purge')
+
+
+class PurgeJob:
+  """Removal of one soft-deleted row and its children.
+
+  ``step`` runs on the worker in a transaction of its own and is called
+  with the batch size until it reports it is done; it returns
+  ``(children_deleted, done)``. ``total`` is the number of children when
+  the job was queued.
+  """
+
+  def __init__(self, kind, id, total, step):
+    self.ticket = uuid4().hex
+    self.kind = kind
+    self.id = id
+    self.total = total
+    self.step = step
+    self.status = 'queued'
+    self.purged = 0
+    self.batches = 0
+    self.error = None
+    self.queued_at = time.time()
+    self.finished_at = None
+    self._done = threading.Event()
+
+  def wait(self, timeout=None):
+    return self._done.wait(timeout)
+
+  def finish(self, error=None):
+    self.status = 'failed' if error else 'done'
+    self.error = error
+    self.step = None
+    self.finished_at = time.time()
+    self._done.set()
+
+  def to_dict(self):
+    return {
+      'ticket': self.ticket, 'kind': self.kind, 'id': self.id, 'status': self.status,
+      'purged': self.purged, 'total': self.total, 'batches': self.batches, 'error': self.error,
+      'progress': round(min(self.purged / self.total, 1.0), 4) if self.total else (1.0 if self.status == 'done' else 0.0),
+    }
+
+
+class PurgeQueue:
+  """Jobs run one at a time by a background worker, a batch per transaction.
+
+  The worker starts on the first submit and sleeps ``pause`` seconds
+  between batches so that a large purge leaves room for other writers.
+  The last ``keep`` jobs stay retrievable by ticket.
+  """
+
+  def __init__(self, app, db, batch_size=1000, pause=0.0, keep=1000):
+    self.app = app
+    self.db = db
+    self.batch_size = batch_size
+    self.pause = pause
+    self.keep = keep
+    self._queue = queue.Queue()
+    self._jobs = OrderedDict()
+    self._lock = threading.Lock()
+    self._worker = None
+
+  def submit(self, kind, id, total, step):
+    job = PurgeJob(kind, id, total, step)
+    with self._lock:
+      self._jobs[job.ticket] = job
+      while len(self._jobs) > self.keep:
+        self._jobs.popitem(last=False)
+      if self._worker is None or not self._worker.is_alive():
+        self._worker = threading.Thread(target=self._run, name='fyyur-purge', daemon=True)
+        self._worker.start()
+    self._queue.put(job)
+    return job
+
+  def get(self, ticket):
+    with self._lock:
+      return self._jobs.get(ticket)
+
+  def jobs(self):
+    with self._lock:
+      return list(self._jobs.values())
+
+  def join(self):
+    """Wait until every job submitted so far has finished."""
+    self._queue.join()
+
+  def close(self, timeout=10):
+    """Stop the worker after the job in hand; queued jobs are left for a later run."""
+    if self._worker is not None and self._worker.is_alive():
+      self._queue.put(None)
+      self._worker.join(timeout)
+
+  def stats(self):
+    jobs = self.jobs()
+    return {
+      'queued': sum(job.status == 'queued' for job in jobs),
+      'running': sum(job.status == 'running' for job in jobs),
+      'done': sum(job.status == 'done' for job in jobs),
+      'failed': sum(job.status == 'failed' for job in jobs),
+      'purged': sum(job.purged for job in jobs),
+    }
+
+  def _run(self):
+    while True:
+      job = self._queue.get()
+      try:
+        if job is None:
+          return
+        with self.app.app_context():
+          self.run(job)
+      finally:
+        self._queue.task_done()
+
+  def run(self, job):
+    """Run ``job`` to the end in the calling thread."""
+    session = self.db.session
+    job.status = 'running'
+    while True:
+      try:
+        deleted, done = job.step(self.batch_size)
+        session.commit()
+      except Exception as error:
+        session.rollback()
+        log.warning('purging %s %s failed after %d rows: %s', job.kind, job.id, job.purged, error)
+        job.finish(error=str(error).splitlines()[0])
+        return
+      finally:
+        session.remove()
+      job.purged += deleted
+      job.batches += 1
+      if done:
+        break
+      if self.pause:
+        time.sleep(self.pause)
+    job.finish()
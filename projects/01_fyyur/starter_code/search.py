@@ -0,0 +1,63 @@
+#----------------------------------------------------------------------------#
+# Name search ranking.
+#----------------------------------------------------------------------------#
+#
+# On Postgres the search query is answered by the pg_trgm GIN indexes added in
+# migration 6f1d2a9c4b7e and the lower(name) indexes of 7c2e9d4f1b36, and
+# ranked in SQL over a bounded set of candidates. Other databases (SQLite
+# during tests) have no trigram support, so the matching rows are ranked here
+# with the same ordering: exact match, prefix match, word prefix, then
+# substring, with closer/shorter names first inside each tier.
+
+from difflib import SequenceMatcher
+from heapq import nsmallest
+
+LIKE_ESCAPE = '!'
+SEARCH_LIMIT = 50
+SUGGEST_LIMIT = 10
+# Search totals stop counting here.
+COUNT_LIMIT = 1000
+# At most this many word-prefix and substring matches are ranked on Postgres.
+RANK_CANDIDATES = 500
+
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+def escape_like(term):
+  """Escape LIKE wildcards so user input only ever matches literally."""
+  return term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def contains_pattern(term):
+  return '%' + escape_like(term) + '%'
+
+
+def prefix_pattern(term):
+  return escape_like(term) + '%'
+
+
+def match_tier(term, name):
+  term, name = term.lower(), name.lower()
+  if name == term:
+    return EXACT
+  if name.startswith(term):
+    return PREFIX
+  if (' ' + term) in name:
+    return WORD_PREFIX
+  return SUBSTRING
+
+
+def rank_key(term, name):
+  similarity = SequenceMatcher(None, term.lower(), name.lower()).ratio()
+  return (match_tier(term, name), -similarity, name.lower())
+
+
+def rank(term, rows, limit=SEARCH_LIMIT, name=lambda row: row.name):
+  """Order already-matching ``rows`` by relevance to ``term``.
+
+  Returns ``(ranked, total)`` where ``ranked`` holds at most ``limit`` rows.
+  Only the top ``limit`` rows are sorted, so ranking stays O(n log limit).
+  """
+  rows = list(rows)
+  ranked = nsmallest(limit, rows, key=lambda row: rank_key(term, name(row)))
+  return ranked, len(rows)
@@ -2,3 +2,20 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Show venues" / "More venues" links on /venues: fetch the next page of an
+// area's venues and put it where the link was.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest && event.target.closest('a.area-venues');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  var url = link.href + (link.href.indexOf('?') === -1 ? '?' : '&') + 'partial=1';
+  fetch(url).then(function (response) {
+    return response.text();
+  }).then(function (html) {
+    link.insertAdjacentHTML('beforebegin', html);
+    link.remove();
+  });
+});
@@ -0,0 +1,154 @@
+#----------------------------------------------------------------------------#
+# Database telemetry.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+  """Counters for one connection pool, fed by MeteredQueuePool and pool events.
+
+  Tracks checkouts, time spent waiting for a free connection, checkout
+  timeouts and when each connection currently in use was taken out, so a
+  connection that never goes back shows up as a growing oldest_checkout_age.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._checked_out = {}
+    self.connects = 0
+    self.checkouts = 0
+    self.checkins = 0
+    self.invalidations = 0
+    self.timeouts = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+    self.waits = 0
+
+  def record_wait(self, seconds, timed_out=False):
+    with self._lock:
+      self.waits += 1
+      self.wait_total += seconds
+      self.wait_max = max(self.wait_max, seconds)
+      if timed_out:
+        self.timeouts += 1
+
+  def watch(self, pool):
+    @event.listens_for(pool, 'connect')
+    def connect(dbapi_connection, record):
+      with self._lock:
+        self.connects += 1
+
+    @event.listens_for(pool, 'checkout')
+    def checkout(dbapi_connection, record, proxy):
+      with self._lock:
+        self.checkouts += 1
+        self._checked_out[id(record)] = time.monotonic()
+
+    @event.listens_for(pool, 'checkin')
+    def checkin(dbapi_connection, record):
+      with self._lock:
+        self.checkins += 1
+        self._checked_out.pop(id(record), None)
+
+    @event.listens_for(pool, 'invalidate')
+    def invalidate(dbapi_connection, record, exception):
+      with self._lock:
+        self.invalidations += 1
+
+  def snapshot(self, pool):
+    with self._lock:
+      oldest = min(self._checked_out.values(), default=None)
+      data = {
+        'connects': self.connects,
+        'checkouts': self.checkouts,
+        'checkins': self.checkins,
+        'invalidations': self.invalidations,
+        'timeouts': self.timeouts,
+        'in_use': len(self._checked_out),
+        'oldest_checkout_age': round(time.monotonic() - oldest, 3) if oldest else 0.0,
+        'wait_avg_ms': round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+        'wait_max_ms': round(self.wait_max * 1000, 3),
+      }
+    if isinstance(pool, QueuePool):
+      data.update(size=pool.size(), checked_in=pool.checkedin(), overflow=pool.overflow())
+    return data
+
+
+class MeteredQueuePool(QueuePool):
+  """QueuePool that times how long each checkout waits for a connection."""
+
+  metrics = None
+
+  def _do_get(self):
+    started = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except PoolTimeout:
+      if self.metrics is not None:
+        self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+      raise
+    if self.metrics is not None:
+      self.metrics.record_wait(time.perf_counter() - started)
+    return connection
+
+  def recreate(self):
+    pool = super().recreate()
+    pool.metrics = self.metrics
+    return pool
+
+
+class QueryStats:
+  """Per-request query count, database time and slowest statements.
+
+  Engine events time every statement; inside a request the numbers are
+  kept on ``flask.g.query_stats``. Statements slower than
+  ``slow_threshold_ms`` go to ``slow_log`` with their parameters, whether
+  or not they ran inside a request.
+  """
+
+  def __init__(self, slow_log, slow_threshold_ms=200, keep_slowest=3):
+    self.slow_log = slow_log
+    self.slow_threshold_ms = slow_threshold_ms
+    self.keep_slowest = keep_slowest
+    # executemany batches can carry thousands of rows; keep log lines sane.
+    self.max_params_length = 2000
+
+  def watch(self, engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+      conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+      elapsed_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+      self.record(statement, parameters, elapsed_ms)
+
+  def record(self, statement, parameters, elapsed_ms):
+    if elapsed_ms >= self.slow_threshold_ms:
+      params = (' params=%r' % (parameters,))[:self.max_params_length] if parameters else ''
+      self.slow_log.warning('%.1f ms %s %s%s', elapsed_ms, request.path if has_request_context() else '-',
+                            ' '.join(statement.split()), params)
+    if not has_request_context():
+      return
+    stats = g.setdefault('query_stats', {'count': 0, 'time_ms': 0.0, 'slowest': []})
+    stats['count'] += 1
+    stats['time_ms'] += elapsed_ms
+    stats['slowest'] = sorted(stats['slowest'] + [(elapsed_ms, statement)], reverse=True)[:self.keep_slowest]
+
+  @staticmethod
+  def current():
+    return g.get('query_stats', {'count': 0, 'time_ms': 0.0, 'slowest': []})
+
+  @staticmethod
+  def summary(stats, width=120):
+    """One line per request: '3 queries, 4.2 ms; slowest: 2.9 ms SELECT ...'."""
+    slowest = ' | '.join('%.1f ms %s' % (ms, ' '.join(statement.split())[:width])
+                         for ms, statement in stats['slowest'])
+    return '%d queries, %.1f ms%s' % (stats['count'], stats['time_ms'], '; slowest: ' + slowest if slowest else '')
@@ -0,0 +1,172 @@
+#----------------------------------------------------------------------------#
+# Write pipeline.
+#----------------------------------------------------------------------------#
+#
+# Form submissions are validated in the request and handed to a single
+# background worker as Submissions. The worker takes whatever has queued up
+# (at most ``batch_size``, waiting up to ``max_wait`` seconds for a batch to
+# fill) and commits it as one transaction, so a burst of writes costs one
+# commit instead of one per request and request threads never hold a
+# connection for a write. If a batch fails, its submissions are retried one
+# per transaction so that a bad one fails alone.
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+log = logging.getLogger('fyyur.writes')
+
+
+class Submission:
+  """One queued write and, once the worker has run it, its outcome.
+
+  ``apply`` runs on the worker inside the batch's transaction and returns
+  ``(id, cache_groups)``: the id of the row it wrote and the page cache
+  groups to invalidate once the batch has committed.
+  """
+
+  def __init__(self, kind, apply):
+    self.ticket = uuid4().hex
+    self.kind = kind
+    self.apply = apply
+    self.status = 'pending'
+    self.id = None
+    self.error = None
+    self.cache_groups = ()
+    self._done = threading.Event()
+
+  def wait(self, timeout=None):
+    """Block until the outcome is known; False if ``timeout`` ran out first."""
+    return self._done.wait(timeout)
+
+  def finish(self, error=None):
+    self.status = 'failed' if error else 'committed'
+    self.error = error
+    self.apply = None
+    self._done.set()
+
+  def to_dict(self):
+    return {'ticket': self.ticket, 'kind': self.kind, 'status': self.status, 'id': self.id, 'error': self.error}
+
+
+class WritePipeline:
+  """Queue of Submissions committed in groups by one background worker.
+
+  The worker starts on the first submit. ``on_commit`` is called with the
+  cache groups of every committed batch. The last ``keep`` submissions stay
+  retrievable by ticket for status checks.
+  """
+
+  def __init__(self, app, db, on_commit=None, batch_size=100, max_wait=0.005, keep=10000):
+    self.app = app
+    self.db = db
+    self.on_commit = on_commit
+    self.batch_size = batch_size
+    self.max_wait = max_wait
+    self.keep = keep
+    self._queue = queue.Queue()
+    self._recent = OrderedDict()
+    self._lock = threading.Lock()
+    self._worker = None
+    self.committed = 0
+    self.failed = 0
+    self.batches = 0
+    self.retried_batches = 0
+
+  def submit(self, kind, apply):
+    submission = Submission(kind, apply)
+    with self._lock:
+      self._recent[submission.ticket] = submission
+      while len(self._recent) > self.keep:
+        self._recent.popitem(last=False)
+      if self._worker is None or not self._worker.is_alive():
+        self._worker = threading.Thread(target=self._run, name='fyyur-writes', daemon=True)
+        self._worker.start()
+    self._queue.put(submission)
+    return submission
+
+  def get(self, ticket):
+    with self._lock:
+      return self._recent.get(ticket)
+
+  def join(self):
+    """Wait until everything submitted so far has been committed or failed."""
+    self._queue.join()
+
+  def close(self, timeout=10):
+    """Let the worker finish what is queued, then stop it."""
+    if self._worker is not None and self._worker.is_alive():
+      self._queue.put(None)
+      self._worker.join(timeout)
+
+  def stats(self):
+    return {
+      'queued': self._queue.qsize(),
+      'committed': self.committed,
+      'failed': self.failed,
+      'batches': self.batches,
+      'retried_batches': self.retried_batches,
+      'batch_avg': round((self.committed + self.failed) / self.batches, 2) if self.batches else 0.0,
+    }
+
+  def _next_batch(self):
+    batch = [self._queue.get()]
+    deadline = time.monotonic() + self.max_wait
+    while batch[-1] is not None and len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self):
+    while True:
+      batch = self._next_batch()
+      submissions = [ submission for submission in batch if submission is not None ]
+      try:
+        if submissions:
+          with self.app.app_context():
+            self._commit(submissions)
+      finally:
+        for _ in batch:
+          self._queue.task_done()
+      if len(submissions) < len(batch):
+        return
+
+  def _commit(self, batch):
+    session = self.db.session
+    self.batches += 1
+    try:
+      for submission in batch:
+        submission.id, submission.cache_groups = submission.apply()
+      session.commit()
+    except Exception as error:
+      session.rollback()
+      if len(batch) > 1:
+        # Find the culprit: every submission gets a transaction of its own.
+        self.retried_batches += 1
+        for submission in batch:
+          self._commit([submission])
+        return
+      log.warning('%s submission %s failed: %s', batch[0].kind, batch[0].ticket, error)
+      self.failed += 1
+      batch[0].id = None
+      batch[0].finish(error=str(error).splitlines()[0])
+      return
+    finally:
+      session.remove()
+
+    # Invalidate before reporting, so a redirect after the outcome sees fresh pages.
+    groups = { group for submission in batch for group in submission.cache_groups }
+    if self.on_commit is not None and groups:
+      try:
+        self.on_commit(groups)
+      except Exception:
+        log.exception('on_commit failed for %s', sorted(groups))
+    self.committed += len(batch)
+    for submission in batch:
+      submission.finish()
@@ -0,0 +1,67 @@
+"""Shared helpers for the trivia benchmarks.
+
+Run the benchmarks from the backend directory against a throwaway
+database, e.g.
+
+  TRIVIA_BENCH_DATABASE_URI=postgresql://localhost:5432/trivia_bench \
+    python -m benchmarks.pagination
+
+The seeder below drops and recreates every table in that database.
+"""
+import os
+import random
+import time
+
+from flaskr import create_app
+from models import db, Question, Category
+
+BENCH_DATABASE_URI = os.environ.get('TRIVIA_BENCH_DATABASE_URI', 'postgresql://localhost:5432/trivia_bench')
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+WORDS = ['river', 'painting', 'planet', 'king', 'movie', 'goal', 'atom', 'empire', 'novel', 'ocean',
+         'mountain', 'composer', 'element', 'battle', 'island', 'team', 'galaxy', 'poet', 'desert', 'song']
+
+
+def setup_database(recreate=True):
+  """An app on the benchmark database, with its context pushed."""
+  app = create_app({'database_path': BENCH_DATABASE_URI})
+  ctx = app.app_context()
+  ctx.push()
+  if recreate:
+    db.drop_all()
+    db.create_all()
+  return app, ctx
+
+
+def seed(questions=1000000, chunk=20000, seed_value=42):
+  """Bulk insert the categories and ``questions`` synthetic questions."""
+  rnd = random.Random(seed_value)
+  db.session.bulk_insert_mappings(Category, [ dict(id=i, type=name) for i, name in enumerate(CATEGORIES, 1) ])
+  for start in range(1, questions + 1, chunk):
+    db.session.bulk_insert_mappings(Question, [ dict(
+      id=i, question='Which %s is %s? (%d)' % (rnd.choice(WORDS), ' '.join(rnd.sample(WORDS, 3)), i),
+      answer=rnd.choice(WORDS).title(), category=str(rnd.randint(1, len(CATEGORIES))),
+      difficulty=rnd.randint(1, 5)) for i in range(start, min(start + chunk, questions + 1)) ])
+    db.session.commit()
+  if db.engine.dialect.name == 'postgresql':
+    for table in ('categories', 'questions'):
+      db.session.execute(db.text(
+        "SELECT setval(pg_get_serial_sequence('%s', 'id'), (SELECT MAX(id) FROM %s))" % (table, table)))
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def measure(fn, repeat=5):
+  """Best of ``repeat`` runs of ``fn``, in seconds."""
+  timings = []
+  for _ in range(repeat):
+    db.session.expunge_all()
+    started = time.perf_counter()
+    fn()
+    timings.append(time.perf_counter() - started)
+  return min(timings)
+
+
+def report(name, fn, repeat=5):
+  seconds = measure(fn, repeat)
+  print('%-40s %10.2f ms' % (name, seconds * 1000))
+  return seconds
@@ -0,0 +1,37 @@
+"""Time /questions pages at increasing depth: OFFSET vs page numbers vs cursors.
+
+  python -m benchmarks.pagination [questions]
+
+Defaults to a million questions. Plain OFFSET grows with the page number;
+a page number reached by paging forward, and every cursor page, should
+take the same time at page 10 as at page 90000.
+"""
+import sys
+
+from flaskr import paginator, QUESTIONS_PER_PAGE
+from flaskr.pagination import encode_cursor
+from models import Question
+from benchmarks.common import setup_database, seed, report
+
+
+def offset_page(number):
+  return Question.query.order_by(Question.id).offset((number - 1) * QUESTIONS_PER_PAGE).limit(QUESTIONS_PER_PAGE).all()
+
+
+if __name__ == '__main__':
+  questions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  app, ctx = setup_database()
+  seed(questions)
+  client = app.test_client()
+  last = questions // QUESTIONS_PER_PAGE
+  for number in (10, last // 10, last // 2, last - 1):
+    paginator.invalidate()
+    report('OFFSET, page %d' % number, lambda: offset_page(number))
+    report('?page=%d, first visit' % number, lambda: (paginator.invalidate(), client.get('/questions?page=%d' % number)), repeat=3)
+    # The previous page was served, so this one's start is known.
+    client.get('/questions?page=%d' % (number - 1))
+    report('?page=%d, after page %d' % (number, number - 1), lambda: client.get('/questions?page=%d' % number))
+    cursor = encode_cursor((number - 1) * QUESTIONS_PER_PAGE)
+    report('?cursor= for page %d' % number, lambda: client.get('/questions?cursor=%s' % cursor))
+  report('total_questions (cached)', lambda: paginator.counts.get('questions', Question.query, 'questions'))
+  ctx.pop()
@@ -0,0 +1,41 @@
+"""Time picking the next quiz question: load-and-choose vs the sampler.
+
+  python -m benchmarks.quiz [questions]
+
+Defaults to a million questions. Loading the category and choosing in
+Python grows with the category and with previous_questions; the sampler
+should take the same time for one category as for all of them, with 0 or
+1000 questions already asked.
+"""
+import random
+import sys
+
+from flaskr import sampler
+from flaskr.quiz import ALL
+from models import Question
+from benchmarks.common import setup_database, seed, report
+
+
+def load_and_choose(category, previous):
+  query = Question.query
+  if category != ALL:
+    query = query.filter(Question.category == str(category))
+  if previous:
+    query = query.filter(Question.id.notin_(previous))
+  return random.choice(query.all())
+
+
+if __name__ == '__main__':
+  questions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  app, ctx = setup_database()
+  seed(questions)
+  client = app.test_client()
+  for category, name in ((1, 'one category'), (ALL, 'all categories')):
+    sampler.question(category)
+    for asked in (0, 1000):
+      previous = random.sample(range(1, questions + 1), asked)
+      report('load and choose, %s, %d asked' % (name, asked), lambda: load_and_choose(category, previous), repeat=2)
+      report('sampler, %s, %d asked' % (name, asked), lambda: sampler.question(category, set(previous)))
+      report('POST /quizzes, %s, %d asked' % (name, asked), lambda: client.post('/quizzes', json={
+        'quiz_category': {'id': category}, 'previous_questions': previous}))
+  ctx.pop()
@@ -0,0 +1,40 @@
+"""Time question search: a full scan and count vs the trigram index and ranking.
+
+  python -m benchmarks.search [questions]
+
+Defaults to a million questions. The scan matches with lower() LIKE, which
+no index serves, and counts every match; POST /questions with a searchTerm
+should cost about the same for a rare term as for one that matches a
+large share of the table.
+"""
+import sys
+
+from sqlalchemy import func
+
+from flaskr.search import contains_pattern, LIKE_ESCAPE
+from models import Question
+from benchmarks.common import setup_database, seed, report
+
+TERMS = ['which galaxy is poet', 'planet', 'Which', '(4242)']
+
+
+def scan(term, page):
+  query = Question.query.filter(func.lower(Question.question).like(contains_pattern(term.lower()), escape=LIKE_ESCAPE))
+  total = query.count()
+  return total, query.order_by(Question.id).offset((page - 1) * 10).limit(10).all()
+
+
+def search(client, term, page):
+  return client.post('/questions', json={'searchTerm': term, 'page': page})
+
+
+if __name__ == '__main__':
+  questions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  app, ctx = setup_database()
+  seed(questions)
+  client = app.test_client()
+  for term in TERMS:
+    for page in (1, 5):
+      report('scan, %r, page %d' % (term, page), lambda: scan(term, page), repeat=2)
+      report('POST /questions, %r, page %d' % (term, page), lambda: search(client, term, page))
+  ctx.pop()
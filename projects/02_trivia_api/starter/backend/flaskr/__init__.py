@@ -4,101 +4,258 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, question_listeners, Question, Category
+from .categories import CategoryCache, category_key
+from .pagination import Paginator, CursorError
+from .quiz import QuestionSampler, ALL
+from .quiz_sessions import QuizSession, MemorySessionStore
+from . import search
 
 QUESTIONS_PER_PAGE = 10
 
+# Shared by every app instance; remembers where pages start and caches totals.
+paginator = Paginator(Question.id, per_page=QUESTIONS_PER_PAGE)
+sampler = QuestionSampler()
+quiz_sessions = MemorySessionStore()
+category_cache = CategoryCache()
+search_index = search.NgramIndex()
+
+def question_changed(action, question_id, category):
+  category_cache.question_changed(action, question_id, category)
+  # A removed question shifts every later page; an added one changes totals.
+  paginator.invalidate()
+  if action == 'insert':
+    sampler.add(question_id, category_key(category))
+  elif action == 'delete':
+    sampler.remove(question_id)
+  else:
+    sampler.invalidate()
+  search_index.remove(question_id)
+  if action != 'delete' and search_index.loaded:
+    search_index.add(question_id, Question.query.get(question_id).question)
+
+question_listeners.append(question_changed)
+
+def questions_page(query, key, total):
+  '''
+  One page of ``query`` (questions by id) for ?page=N or ?cursor=...
+
+  Answers 400 for a malformed cursor and 404 for a page past the end.
+  '''
+  try:
+    page = paginator.page(query, key, number=request.args.get('page', 1, type=int),
+                          cursor=request.args.get('cursor'), total=total)
+  except CursorError:
+    abort(400)
+  if not page.items and (page.number or 1) > 1:
+    abort(404)
+  return page
+
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
-  
-  '''
-  @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
-  '''
+  if test_config is None:
+    setup_db(app)
+  else:
+    setup_db(app, test_config['database_path'])
+  CORS(app, resources={r'/*': {'origins': '*'}})
+
+  @app.after_request
+  def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,DELETE,OPTIONS')
+    return response
 
   '''
-  @TODO: Use the after_request decorator to set Access-Control-Allow
+  GET /categories is served from the category cache, with an ETag that
+  changes whenever a category or a question count does.
   '''
+  @app.route('/categories')
+  def get_categories():
+    categories = category_cache.snapshot()
+    response = jsonify({
+      'success': True,
+      'categories': categories.types,
+      'question_counts': {category: count for category, count in categories.counts.items() if category is not None}
+    })
+    response.set_etag(categories.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests 
-  for all available categories.
+  GET /questions?page=N pages through every question by id, ten at a time.
+  Each page carries a next_cursor; /questions?cursor=<next_cursor> serves
+  the following page with a single index seek, however deep it is.
   '''
+  @app.route('/questions')
+  def get_questions():
+    categories = category_cache.snapshot()
+    page = questions_page(Question.query, 'questions', categories.total)
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in page.items],
+      'total_questions': page.total,
+      'categories': categories.types,
+      'current_category': None,
+      'page': page.number,
+      'next_cursor': page.next_cursor
+    })
 
+  @app.route('/questions/<int:question_id>', methods=['DELETE'])
+  def delete_question(question_id):
+    question = Question.query.get_or_404(question_id)
+    question.delete()
+    return jsonify({
+      'success': True,
+      'deleted': question_id,
+      'total_questions': category_cache.snapshot().total
+    })
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests for questions, 
-  including pagination (every 10 questions). 
-  This endpoint should return a list of questions, 
-  number of total questions, current category, categories. 
-
-  TEST: At this point, when you start the application
-  you should see questions and categories generated,
-  ten questions per page and pagination at the bottom of the screen for three pages.
-  Clicking on the page numbers should update the questions. 
+  POST /questions {"searchTerm": "..."} searches instead of creating: it
+  returns the questions containing the term, closest matches first, a
+  page (?page=N or "page" in the body) at a time, with a next_cursor to
+  send back as "cursor" for the page after. total_questions stops
+  counting at search.COUNT_LIMIT; has_more says whether there are more.
   '''
+  @app.route('/questions', methods=['POST'])
+  def post_questions():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+      abort(400)
+    if 'searchTerm' in body:
+      return search_questions(body)
+    return create_question(body)
 
-  '''
-  @TODO: 
-  Create an endpoint to DELETE question using a question ID. 
+  def search_questions(body):
+    term = body.get('searchTerm')
+    try:
+      page = int(body.get('page', request.args.get('page', 1)))
+    except (TypeError, ValueError):
+      abort(422)
+    if not isinstance(term, str) or not term.strip() or page < 1:
+      abort(422)
+    cursor = body.get('cursor') or request.args.get('cursor')
+    try:
+      total, has_more, questions, next_cursor = search.search(
+        term.strip(), page, cursor, QUESTIONS_PER_PAGE, index=search_index)
+    except CursorError:
+      abort(400)
+    if not questions and (page > 1 or cursor):
+      abort(404)
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in questions],
+      'total_questions': total,
+      'has_more': has_more,
+      'current_category': None,
+      'page': None if cursor else page,
+      'next_cursor': next_cursor
+    })
 
-  TEST: When you click the trash icon next to a question, the question will be removed.
-  This removal will persist in the database and when you refresh the page. 
-  '''
+  def create_question(body):
+    question, answer = body.get('question'), body.get('answer')
+    try:
+      category, difficulty = int(body.get('category')), int(body.get('difficulty'))
+    except (TypeError, ValueError):
+      abort(422)
+    if (not isinstance(question, str) or not question.strip() or not isinstance(answer, str) or not answer.strip()
+        or category not in category_cache.snapshot().types or not 1 <= difficulty <= 5):
+      abort(422)
+    question = Question(question.strip(), answer.strip(), str(category), difficulty)
+    question.insert()
+    return jsonify({
+      'success': True,
+      'created': question.id,
+      'total_questions': category_cache.snapshot().total
+    }), 201
 
-  '''
-  @TODO: 
-  Create an endpoint to POST a new question, 
-  which will require the question and answer text, 
-  category, and difficulty score.
-
-  TEST: When you submit a question on the "Add" tab, 
-  the form will clear and the question will appear at the end of the last page
-  of the questions list in the "List" tab.  
-  '''
+  @app.route('/categories/<int:category_id>/questions')
+  def get_category_questions(category_id):
+    categories = category_cache.snapshot()
+    if category_id not in categories.types:
+      abort(404)
+    query = Question.query.filter(Question.category == str(category_id))
+    page = questions_page(query, 'category:%d' % category_id, categories.count(category_id))
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in page.items],
+      'total_questions': page.total,
+      'current_category': categories.types[category_id],
+      'page': page.number,
+      'next_cursor': page.next_cursor
+    })
 
-  '''
-  @TODO: 
-  Create a POST endpoint to get questions based on a search term. 
-  It should return any questions for whom the search term 
-  is a substring of the question. 
-
-  TEST: Search by any phrase. The questions list will update to include 
-  only question that include that string within their question. 
-  Try using the word "title" to start. 
-  '''
 
   '''
-  @TODO: 
-  Create a GET endpoint to get questions based on category. 
+  POST /quizzes {"quiz_category": {"id": ...}, "previous_questions": [...]}
+  returns a random question of the category (id 0 for all of them) that
+  is not among previous_questions, or null once none are left. The pick
+  comes from the sampler's in-memory ids, so only the chosen question is
+  read from the database.
 
-  TEST: In the "List" tab / main screen, clicking on one of the 
-  categories in the left column will cause only questions of that 
-  category to be shown. 
+  The response also carries a quiz_session token. Sending it back as
+  {"quiz_session": token} continues the game: the server remembers the
+  category and what has been asked, so the request stays the same size
+  however long the game runs. An unknown session is a 404; the client
+  then starts over from its previous_questions.
   '''
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+      abort(400)
+    if body.get('quiz_session'):
+      session = quiz_sessions.get(body['quiz_session'])
+      if session is None:
+        abort(404)
+    else:
+      try:
+        category = int((body.get('quiz_category') or {}).get('id', ALL))
+        session = QuizSession(category, (int(question_id) for question_id in body.get('previous_questions') or []))
+      except (AttributeError, TypeError, ValueError):
+        abort(422)
+      if category != ALL and category not in category_cache.snapshot().types:
+        abort(404)
+    question = sampler.question(session.category, session.seen)
+    if question is None:
+      quiz_sessions.delete(session.token)
+    else:
+      session.seen.add(question.id)
+      quiz_sessions.put(session)
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None,
+      'quiz_session': session.token if question else None
+    })
 
+  def error_response(status, message):
+    return jsonify({
+      'success': False,
+      'error': status,
+      'message': message
+    }), status
 
-  '''
-  @TODO: 
-  Create a POST endpoint to get questions to play the quiz. 
-  This endpoint should take category and previous question parameters 
-  and return a random questions within the given category, 
-  if provided, and that is not one of the previous questions. 
-
-  TEST: In the "Play" tab, after a user selects "All" or a category,
-  one question at a time is displayed, the user is allowed to answer
-  and shown whether they were correct or not. 
-  '''
+  @app.errorhandler(400)
+  def bad_request(error):
+    return error_response(400, 'bad request')
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return error_response(404, 'resource not found')
+
+  @app.errorhandler(405)
+  def method_not_allowed(error):
+    return error_response(405, 'method not allowed')
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return error_response(422, 'unprocessable')
+
+  @app.errorhandler(500)
+  def server_error(error):
+    return error_response(500, 'internal server error')
 
-  '''
-  @TODO: 
-  Create error handlers for all expected errors 
-  including 404 and 422. 
-  '''
-  
   return app
 
     
\ No newline at end of file
@@ -0,0 +1,94 @@
+import hashlib
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import db, Question, Category
+
+'''
+Category cache
+  Every screen asks for the categories, and the /questions pages carry
+  them too, yet the table almost never changes. CategoryCache loads the
+  id -> type map and the number of questions in each category once, keeps
+  the counts current as questions are inserted and deleted, and hands out
+  immutable snapshots, so serving them costs no database round trip.
+'''
+
+
+def category_key(category):
+  '''Question.category holds the id as a string; counts are keyed by the int (None when unset).'''
+  try:
+    return int(category)
+  except (TypeError, ValueError):
+    return None
+
+
+class CategorySnapshot:
+  def __init__(self, types, counts):
+    self.types = types
+    self.counts = counts
+    self.total = sum(counts.values())
+    self.etag = hashlib.sha1(repr((sorted(types.items()), sorted(counts.items(), key=repr))).encode()).hexdigest()
+
+  def count(self, category):
+    return self.counts.get(category, 0)
+
+
+class CategoryCache:
+  '''
+  Snapshots of the categories and their question counts.
+
+  Inserts and deletes adjust the counts in place; anything else (an
+  update that may have moved a question, a change to the categories)
+  calls invalidate() and the next snapshot is reloaded. ``ttl`` bounds
+  how long a snapshot is trusted against writes made outside the app.
+  '''
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._snapshot = None
+    self._loaded_at = 0.0
+    # Bumped on every change, so a load that raced one is not kept.
+    self._generation = 0
+    self._lock = threading.Lock()
+
+  def snapshot(self):
+    now = time.monotonic()
+    with self._lock:
+      snapshot = self._snapshot
+      if snapshot is not None and self._loaded_at + self.ttl > now:
+        return snapshot
+      generation = self._generation
+    snapshot = self._load()
+    with self._lock:
+      if generation == self._generation:
+        self._snapshot, self._loaded_at = snapshot, now
+    return snapshot
+
+  def question_changed(self, action, question_id, category):
+    if action not in ('insert', 'delete'):
+      self.invalidate()
+      return
+    key = category_key(category)
+    with self._lock:
+      self._generation += 1
+      snapshot = self._snapshot
+      if snapshot is None:
+        return
+      counts = dict(snapshot.counts)
+      counts[key] = counts.get(key, 0) + (1 if action == 'insert' else -1)
+      self._snapshot = CategorySnapshot(snapshot.types, counts)
+
+  def invalidate(self):
+    with self._lock:
+      self._generation += 1
+      self._snapshot = None
+
+  def _load(self):
+    types = {category.id: category.type for category in Category.query.order_by(Category.id)}
+    counts = {}
+    for category, count in db.session.query(Question.category, func.count(Question.id)).group_by(Question.category):
+      key = category_key(category)
+      counts[key] = counts.get(key, 0) + count
+    return CategorySnapshot(types, counts)
@@ -0,0 +1,202 @@
+import base64
+import binascii
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from sqlalchemy import false, text
+
+'''
+Pagination
+  Pages of a query ordered by an integer key column (the primary key), in
+  two flavours:
+
+  - page numbers (?page=N), the contract the frontend uses. Page N starts
+    at the first key past the end of page N-1, so the paginator remembers
+    where each page it has served starts and seeks from the nearest one
+    instead of scanning and discarding every earlier row with OFFSET.
+  - an opaque cursor (?cursor=...), returned as next_cursor with every
+    page. It holds the last key served, so the next page is one index seek
+    however deep it is.
+
+  Totals come from a CountCache instead of COUNT(*) on every call.
+'''
+
+
+class CursorError(ValueError):
+  '''A cursor that this paginator did not issue.'''
+
+
+def encode_cursor(key):
+  return base64.urlsafe_b64encode(('k%d' % key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    if not raw.startswith('k'):
+      raise ValueError(raw)
+    return int(raw[1:])
+  except (binascii.Error, UnicodeDecodeError, ValueError):
+    raise CursorError('invalid cursor %r' % cursor)
+
+
+class Page:
+  def __init__(self, items, number, per_page, total, next_cursor):
+    self.items = items
+    self.number = number
+    self.per_page = per_page
+    self.total = total
+    self.next_cursor = next_cursor
+
+
+class CountCache:
+  '''
+  Row counts per query key, reused for ``ttl`` seconds.
+
+  An unfiltered count of a large Postgres table is read from the planner's
+  estimate (pg_class.reltuples) rather than counted; below
+  ``exact_below`` rows, or for a filtered query, the count is exact.
+  '''
+
+  def __init__(self, ttl=60, exact_below=100000):
+    self.ttl = ttl
+    self.exact_below = exact_below
+    self._counts = {}
+    self._lock = threading.Lock()
+
+  def get(self, key, query, table=None):
+    now = time.monotonic()
+    with self._lock:
+      cached = self._counts.get(key)
+    if cached is not None and cached[1] > now:
+      return cached[0]
+    count = None
+    if table is not None:
+      count = self.estimate(query.session, table)
+    if count is None:
+      count = query.order_by(None).count()
+    with self._lock:
+      self._counts[key] = (count, now + self.ttl)
+    return count
+
+  def estimate(self, session, table):
+    if session.get_bind().dialect.name != 'postgresql':
+      return None
+    estimate = session.execute(
+      text('SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)'), {'table': table}).scalar()
+    # -1 (never analyzed) or a small table: count it.
+    if estimate is None or estimate < self.exact_below:
+      return None
+    return int(estimate)
+
+  def invalidate(self, key=None):
+    with self._lock:
+      if key is None:
+        self._counts.clear()
+      else:
+        self._counts.pop(key, None)
+
+
+class Paginator:
+  '''
+  Serves pages of queries ordered by ``column``.
+
+  Each query is identified by a ``key`` chosen by the caller (e.g.
+  'questions' or 'category:3'); the paginator remembers the first key of
+  up to ``bookmarks`` pages for each of the last ``keys`` queries. Writes
+  that remove or reorder rows must call invalidate(). Like the counts, a
+  query's bookmarks are dropped ``count_ttl`` seconds after the first was
+  taken, so writes made by other processes shift page boundaries for that
+  long at most.
+  '''
+
+  def __init__(self, column, per_page=10, count_ttl=60, bookmarks=10000, keys=256):
+    self.column = column
+    self.per_page = per_page
+    self.counts = CountCache(ttl=count_ttl)
+    self.bookmark_ttl = count_ttl
+    self.max_bookmarks = bookmarks
+    self.max_keys = keys
+    self._bookmarks = OrderedDict()
+    self._lock = threading.Lock()
+
+  def page(self, query, key, number=None, cursor=None, table=None, total=None):
+    '''
+    Page ``number`` (from 1), or the page after ``cursor``, of ``query``.
+
+    ``total`` is the number of rows if the caller knows it; otherwise it
+    comes from the count cache, and ``table`` names the table when
+    ``query`` is unfiltered, so that a large total may come from the
+    planner's estimate. Raises CursorError for a cursor that does not
+    decode.
+    '''
+    column = self.column
+    if cursor is not None:
+      rows = query.filter(column > decode_cursor(cursor)).order_by(column).limit(self.per_page + 1).all()
+      number = None
+    else:
+      number = max(number or 1, 1)
+      rows = self._seek(query, key, number).limit(self.per_page + 1).all()
+    has_more = len(rows) > self.per_page
+    if number is not None and rows:
+      self._remember(key, number, self._key(rows[0]))
+      if has_more:
+        self._remember(key, number + 1, self._key(rows[self.per_page]))
+    rows = rows[:self.per_page]
+    next_cursor = encode_cursor(self._key(rows[-1])) if has_more else None
+    if total is None:
+      total = self.counts.get(key, query, table)
+    return Page(rows, number, self.per_page, total, next_cursor)
+
+  def invalidate(self, key=None):
+    with self._lock:
+      if key is None:
+        self._bookmarks.clear()
+      else:
+        self._bookmarks.pop(key, None)
+    self.counts.invalidate(key)
+
+  def _key(self, row):
+    return getattr(row, self.column.key)
+
+  def _seek(self, query, key, number):
+    # Start from the nearest page at or before ``number`` whose first key
+    # is known; only the pages in between are skipped, and those by an
+    # index-only scan of the key column.
+    with self._lock:
+      pages, starts = self._live_bookmarks(key, time.monotonic())
+      at = bisect_right(pages, number) - 1
+      known, start = (pages[at], starts[at]) if at >= 0 else (1, None)
+    if start is not None:
+      query = query.filter(self.column >= start)
+    skip = (number - known) * self.per_page
+    if skip:
+      start = query.with_entities(self.column).order_by(self.column).offset(skip).limit(1).scalar()
+      if start is None:
+        return query.filter(false()).order_by(self.column)
+      query = query.filter(self.column >= start)
+    return query.order_by(self.column)
+
+  def _live_bookmarks(self, key, now):
+    pages, starts, expires = self._bookmarks.get(key, ([], [], None))
+    if expires is not None and expires <= now:
+      del self._bookmarks[key]
+      return [], []
+    return pages, starts
+
+  def _remember(self, key, number, start):
+    now = time.monotonic()
+    with self._lock:
+      pages, starts = self._live_bookmarks(key, now)
+      expires = self._bookmarks.pop(key, (None, None, now + self.bookmark_ttl))[2]
+      self._bookmarks[key] = (pages, starts, expires)
+      while len(self._bookmarks) > self.max_keys:
+        self._bookmarks.popitem(last=False)
+      at = bisect_right(pages, number)
+      if at and pages[at - 1] == number:
+        starts[at - 1] = start
+      elif len(pages) < self.max_bookmarks:
+        pages.insert(at, number)
+        starts.insert(at, start)
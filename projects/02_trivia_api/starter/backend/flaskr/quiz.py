@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from array import array
+
+from sqlalchemy import select
+
+from models import db, Question
+
+'''
+Quiz sampling
+  A QuestionSampler keeps the question ids of every category (and of all
+  categories together) as a compact in-memory array, loaded once and then
+  kept current by add() and remove(). Picking an unseen question draws
+  random positions from the array and rejects the ones already seen, so
+  neither the size of the category nor the number of questions asked so
+  far decides how much is read from the database: one primary key lookup.
+'''
+
+ALL = 0
+
+
+class QuestionSampler:
+  '''
+  Random unseen question ids per category.
+
+  The ids of a category are loaded on first use and reloaded after ``ttl``
+  seconds as a safety net for writes that bypass add() and remove().
+  ``attempts`` random draws are tried before falling back to walking the
+  array from a random position, which only happens once almost every
+  question of the category has been asked.
+  '''
+
+  def __init__(self, ttl=3600, attempts=32, rng=None):
+    self.ttl = ttl
+    self.attempts = attempts
+    self.rng = rng or random.Random()
+    self._pools = {}
+    self._lock = threading.Lock()
+
+  def pick(self, category, seen=()):
+    '''
+    A random question id of ``category`` (ALL for any) not in ``seen``,
+    or None when every one has been seen.
+
+    ``seen`` must support ``in``: a set, or anything with the same
+    membership test (a quiz session's bitset).
+    '''
+    ids, removed, loaded_at = self._pool(category)
+    size = len(ids)
+    if not size:
+      return None
+    for _ in range(self.attempts):
+      candidate = ids[self.rng.randrange(size)]
+      if candidate not in seen and candidate not in removed:
+        return candidate
+    start = self.rng.randrange(size)
+    for offset in range(size):
+      candidate = ids[(start + offset) % size]
+      if candidate not in seen and candidate not in removed:
+        return candidate
+    return None
+
+  def question(self, category, seen=()):
+    '''The Question for pick(), skipping ids deleted behind the sampler's back.'''
+    while True:
+      question_id = self.pick(category, seen)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      self.remove(question_id)
+
+  def add(self, question_id, category):
+    with self._lock:
+      for key in (ALL, category):
+        pool = self._pools.get(key)
+        if pool is not None:
+          pool[0].append(question_id)
+          pool[1].discard(question_id)
+
+  def remove(self, question_id):
+    # Removed ids stay in the arrays until the next load and are skipped.
+    with self._lock:
+      for ids, removed, loaded_at in self._pools.values():
+        removed.add(question_id)
+
+  def invalidate(self):
+    with self._lock:
+      self._pools.clear()
+
+  def _pool(self, category):
+    now = time.monotonic()
+    with self._lock:
+      pool = self._pools.get(category)
+    if pool is None or pool[2] + self.ttl <= now:
+      pool = (self._load(category), set(), now)
+      with self._lock:
+        self._pools[category] = pool
+    return pool
+
+  def _load(self, category):
+    query = select([Question.id])
+    if category != ALL:
+      query = query.where(Question.category == str(category))
+    return array('l', (row[0] for row in db.session.execute(query.order_by(Question.id))))
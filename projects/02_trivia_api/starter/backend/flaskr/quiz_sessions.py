@@ -0,0 +1,132 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Quiz sessions
+  Instead of sending every question it has asked with each /quizzes
+  request, a client can hold a session token: the server remembers the
+  game's category and the questions already asked, as a sparse bitset over
+  question ids, so every step of a game is the same small request however
+  long the game runs.
+
+  Sessions live in a store with get/put/delete; MemorySessionStore keeps
+  them in process and drops those unused for ``ttl`` seconds. It only
+  suits a single server process: run several workers and a game's next
+  request may land on one that never saw its session. A shared store can
+  keep QuizSession.dumps() and rebuild them with QuizSession.loads().
+  Either way a session can be gone (expired, or lost in a restart), so
+  /quizzes answers 404 for it and clients resend previous_questions.
+'''
+
+
+class Bitset:
+  '''Set of non-negative ints, one bit each, in 64-bit words kept only where set.'''
+
+  def __init__(self, values=()):
+    self._words = {}
+    self._count = 0
+    for value in values:
+      self.add(value)
+
+  def add(self, value):
+    if value < 0:
+      raise ValueError('%d is negative' % value)
+    word, bit = divmod(value, 64)
+    current = self._words.get(word, 0)
+    if not current >> bit & 1:
+      self._words[word] = current | 1 << bit
+      self._count += 1
+
+  def __contains__(self, value):
+    word, bit = divmod(value, 64)
+    return bool(self._words.get(word, 0) >> bit & 1)
+
+  def __len__(self):
+    return self._count
+
+  def __iter__(self):
+    for word in sorted(self._words):
+      bits = self._words[word]
+      while bits:
+        low = bits & -bits
+        yield word * 64 + low.bit_length() - 1
+        bits ^= low
+
+  def to_bytes(self):
+    return b''.join(word.to_bytes(8, 'big') + bits.to_bytes(8, 'big')
+                    for word, bits in sorted(self._words.items()))
+
+  @classmethod
+  def from_bytes(cls, data):
+    bitset = cls()
+    for offset in range(0, len(data), 16):
+      word = int.from_bytes(data[offset:offset + 8], 'big')
+      bits = int.from_bytes(data[offset + 8:offset + 16], 'big')
+      bitset._words[word] = bits
+      bitset._count += bin(bits).count('1')
+    return bitset
+
+
+class QuizSession:
+  def __init__(self, category, seen=(), token=None):
+    self.token = token or secrets.token_urlsafe(16)
+    self.category = category
+    self.seen = seen if isinstance(seen, Bitset) else Bitset(seen)
+
+  def dumps(self):
+    return b'%d:' % self.category + self.seen.to_bytes()
+
+  @classmethod
+  def loads(cls, token, data):
+    category, _, seen = data.partition(b':')
+    return cls(int(category), Bitset.from_bytes(seen), token=token)
+
+
+class MemorySessionStore:
+  '''
+  Sessions in process, dropped ``ttl`` seconds after their last use; past
+  ``max_sessions`` the least recently used go first.
+  '''
+
+  def __init__(self, ttl=3600, max_sessions=100000):
+    self.ttl = ttl
+    self.max_sessions = max_sessions
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, token):
+    now = time.monotonic()
+    with self._lock:
+      self._expire(now)
+      entry = self._sessions.get(token)
+      if entry is None:
+        return None
+      self._sessions[token] = (entry[0], now + self.ttl)
+      self._sessions.move_to_end(token)
+      return entry[0]
+
+  def put(self, session):
+    now = time.monotonic()
+    with self._lock:
+      self._sessions[session.token] = (session, now + self.ttl)
+      self._sessions.move_to_end(session.token)
+      self._expire(now)
+      while len(self._sessions) > self.max_sessions:
+        self._sessions.popitem(last=False)
+
+  def delete(self, token):
+    with self._lock:
+      self._sessions.pop(token, None)
+
+  def __len__(self):
+    return len(self._sessions)
+
+  def _expire(self, now):
+    # Entries are in order of last use, so the expired ones are at the front.
+    while self._sessions:
+      token, (session, expires) = next(iter(self._sessions.items()))
+      if expires > now:
+        break
+      del self._sessions[token]
@@ -0,0 +1,208 @@
+import base64
+import binascii
+import re
+import threading
+from array import array
+
+from sqlalchemy import and_, func, or_, select
+
+from models import db, Question
+from .pagination import CursorError
+
+'''
+Question search
+  search() finds the questions whose text contains a term, case
+  insensitively, best matches first, a page at a time.
+
+  The candidates are the first COUNT_LIMIT + 1 matches in id order: they
+  give the total (which stops at COUNT_LIMIT) and are ranked by trigram
+  similarity to the term, ties in id order. A page is read from that
+  ranking by number, or after a cursor holding the last score and id
+  served. Bounding the candidates bounds the work of a page however many
+  questions match; a term matching more than COUNT_LIMIT questions is
+  ranked among the first of them only.
+
+  On Postgres the pg_trgm GIN index on questions.question (see
+  migrations/001_question_search.sql) answers the ILIKE filter and
+  similarity() scores the candidates. Elsewhere (SQLite in tests) an
+  in-memory NgramIndex over the same trigrams does both.
+'''
+
+PER_PAGE = 10
+COUNT_LIMIT = 1000
+LIKE_ESCAPE = '!'
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def contains_pattern(term):
+  '''ILIKE pattern for ``term`` anywhere, with its wildcards taken literally.'''
+  escaped = term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace('%', LIKE_ESCAPE + '%').replace('_', LIKE_ESCAPE + '_')
+  return '%' + escaped + '%'
+
+
+def encode_cursor(score, question_id):
+  return base64.urlsafe_b64encode(('s%r:%d' % (score, question_id)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+  '''``(score, id)`` of the last question a page served.'''
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    if not raw.startswith('s'):
+      raise ValueError(raw)
+    score, question_id = raw[1:].split(':')
+    return float(score), int(question_id)
+  except (binascii.Error, UnicodeDecodeError, ValueError):
+    raise CursorError('invalid cursor %r' % cursor)
+
+
+def padded_words(text):
+  '''Each word lowercased and padded with two spaces before and one after, as pg_trgm does.'''
+  return [ '  ' + word + ' ' for word in WORD.findall(text.lower()) ]
+
+
+def trigrams(text):
+  '''The trigrams pg_trgm extracts from ``text``.'''
+  return { padded[i:i + 3] for padded in padded_words(text) for i in range(len(padded) - 2) }
+
+
+def similarity(term_grams, padded, count):
+  '''
+  pg_trgm's similarity(): the share of trigrams the two have in common, for
+  a text given by its joined padded words and its number of trigrams.
+
+  Joining adds only trigrams ending in two spaces, which no word yields, so
+  a trigram of the term is in the text exactly when it is in the string.
+  '''
+  common = sum(gram in padded for gram in term_grams)
+  union = len(term_grams) + count - common
+  return common / union if union else 0.0
+
+
+class NgramIndex:
+  '''
+  Inverted index from trigram to the ids of the questions containing it.
+
+  Built from the questions table on first use and then kept current with
+  add() and remove(). A search looks up the rarest trigram of the term,
+  checks only those questions for the substring and scores the
+  candidates. Each question is kept as its lowercased text, its joined
+  padded words and its trigram count, which is all the scoring needs.
+  '''
+
+  def __init__(self):
+    self._texts = None
+    self._postings = {}
+    self._lock = threading.Lock()
+
+  @property
+  def loaded(self):
+    return self._texts is not None
+
+  def search(self, term):
+    '''
+    ``(matches, ranked)``: the number of candidates, and their
+    ``(score, id)`` best first.
+    '''
+    self._load()
+    needle = term.lower()
+    term_grams = trigrams(term)
+    with self._lock:
+      texts = self._texts
+      # An updated question is listed again under its new trigrams.
+      matches = sorted(question_id for question_id in set(self._candidates(needle))
+                       if question_id in texts and needle in texts[question_id][0])[:COUNT_LIMIT + 1]
+      ranked = sorted(((similarity(term_grams, *texts[question_id][1:]), question_id) for question_id in matches),
+                      key=lambda match: (-match[0], match[1]))
+    return len(matches), ranked
+
+  def add(self, question_id, text):
+    if not self.loaded:
+      return
+    with self._lock:
+      self._add(question_id, text or '')
+
+  def remove(self, question_id):
+    # Postings keep the id; it is skipped once its text is gone.
+    if not self.loaded:
+      return
+    with self._lock:
+      self._texts.pop(question_id, None)
+
+  def invalidate(self):
+    with self._lock:
+      self._texts = None
+      self._postings = {}
+
+  def _candidates(self, needle):
+    # Trigrams inside each word of the term (no padding: the term may
+    # start or end mid-word). Without any, every question is a candidate.
+    grams = [ word[i:i + 3] for word in WORD.findall(needle) for i in range(len(word) - 2) ]
+    if not grams:
+      return list(self._texts)
+    postings = [ self._postings.get(gram, ()) for gram in grams ]
+    return min(postings, key=len)
+
+  def _add(self, question_id, text):
+    grams = trigrams(text)
+    self._texts[question_id] = (text.lower(), ''.join(padded_words(text)), len(grams))
+    for gram in grams:
+      self._postings.setdefault(gram, array('l')).append(question_id)
+
+  def _load(self):
+    with self._lock:
+      if self._texts is not None:
+        return
+      self._texts = {}
+      for question_id, text in db.session.execute(select([Question.id, Question.question]).order_by(Question.id)):
+        self._add(question_id, text or '')
+
+
+def search(term, page=1, cursor=None, per_page=PER_PAGE, index=None):
+  '''
+  Page ``page`` of the questions containing ``term``, or the page after
+  ``cursor``, best matches first.
+
+  Returns ``(total, has_more, questions, next_cursor)``; ``total`` stops
+  at COUNT_LIMIT and ``has_more`` says whether more questions match.
+  Raises CursorError for a cursor that does not decode. ``index`` is the
+  NgramIndex used off Postgres.
+  '''
+  after = decode_cursor(cursor) if cursor is not None else None
+  if db.engine.dialect.name != 'postgresql':
+    matches, ranked = index.search(term)
+    if after is not None:
+      ranked = [ match for match in ranked if (-match[0], match[1]) > (-after[0], after[1]) ]
+    else:
+      ranked = ranked[(page - 1) * per_page:]
+    ranked = ranked[:per_page + 1]
+    questions = {question.id: question for question in Question.query.filter(
+      Question.id.in_([ question_id for _, question_id in ranked ]))} if ranked else {}
+    rows = [ (score, questions[question_id]) for score, question_id in ranked if question_id in questions ]
+  else:
+    candidates = db.session.query(Question.id.label('id'), func.similarity(Question.question, term).label('score')
+      ).filter(Question.question.ilike(contains_pattern(term), escape=LIKE_ESCAPE)
+      ).order_by(Question.id
+      ).limit(COUNT_LIMIT + 1
+      ).subquery()
+    # The window runs over every candidate, before a page is cut from them.
+    ranked = db.session.query(candidates.c.id, candidates.c.score, func.count().over().label('matches')
+      ).subquery()
+    page_rows = db.session.query(ranked).order_by(ranked.c.score.desc(), ranked.c.id)
+    if after is not None:
+      page_rows = page_rows.filter(or_(ranked.c.score < after[0], and_(ranked.c.score == after[0], ranked.c.id > after[1])))
+    else:
+      page_rows = page_rows.offset((page - 1) * per_page)
+    # Only the rows of the page are joined to their questions.
+    page_rows = page_rows.limit(per_page + 1).subquery()
+    rows = db.session.query(page_rows.c.score, Question, page_rows.c.matches
+      ).join(Question, Question.id == page_rows.c.id
+      ).order_by(page_rows.c.score.desc(), page_rows.c.id
+      ).all()
+    matches = rows[0].matches if rows else 0
+    rows = [ (row.score, row.Question) for row in rows ]
+  has_next = len(rows) > per_page
+  rows = rows[:per_page]
+  next_cursor = encode_cursor(rows[-1][0], rows[-1][1].id) if has_next else None
+  return min(matches, COUNT_LIMIT), matches > COUNT_LIMIT, [ question for _, question in rows ], next_cursor
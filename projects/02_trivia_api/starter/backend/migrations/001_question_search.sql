@@ -0,0 +1,14 @@
+-- Question search: a trigram index on questions.question answers the
+-- ILIKE '%term%' filter of POST /questions {"searchTerm": ...}.
+--
+-- Apply to an existing database with:
+--   psql trivia < migrations/001_question_search.sql
+-- Databases restored from trivia.psql, or whose tables were created by
+-- setup_db(), already have it.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Databases loaded before it was added to trivia.psql.
+CREATE INDEX IF NOT EXISTS ix_questions_category_id ON questions USING btree (category, id);
+
+CREATE INDEX IF NOT EXISTS ix_questions_question_trgm ON questions USING gin (question gin_trgm_ops);
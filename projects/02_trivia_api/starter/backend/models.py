@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, DDL, create_engine, event
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -19,6 +19,18 @@ def setup_db(app, database_path=database_path):
     db.init_app(app)
     db.create_all()
 
+'''
+question_listeners
+    callables run after Question.insert(), update() or delete() commits, with
+    the action ('insert', 'update' or 'delete'), the question id and its
+    category; the app keeps its caches current through them
+'''
+question_listeners = []
+
+def notify_question_listeners(action, question_id, category):
+    for listener in question_listeners:
+        listener(action, question_id, category)
+
 '''
 Question
 
@@ -32,6 +44,14 @@ class Question(db.Model):
   category = Column(String)
   difficulty = Column(Integer)
 
+  # Pages of a category are read in id order; searches (ILIKE '%term%')
+  # are answered by the trigram index. Databases created before these
+  # indexes get them from migrations/001_question_search.sql.
+  __table_args__ = (
+    Index('ix_questions_category_id', 'category', 'id'),
+    Index('ix_questions_question_trgm', 'question', postgresql_using='gin', postgresql_ops={'question': 'gin_trgm_ops'}),
+  )
+
   def __init__(self, question, answer, category, difficulty):
     self.question = question
     self.answer = answer
@@ -41,13 +61,17 @@ class Question(db.Model):
   def insert(self):
     db.session.add(self)
     db.session.commit()
+    notify_question_listeners('insert', self.id, self.category)
   
   def update(self):
     db.session.commit()
+    notify_question_listeners('update', self.id, self.category)
 
   def delete(self):
+    question_id, category = self.id, self.category
     db.session.delete(self)
     db.session.commit()
+    notify_question_listeners('delete', question_id, category)
 
   def format(self):
     return {
@@ -58,6 +82,10 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+# The trigram index needs pg_trgm.
+event.listen(Question.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 '''
 Category
 
@@ -2,9 +2,13 @@ import os
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, paginator, sampler, category_cache, search_index
+from flaskr.quiz import ALL
+from flaskr.quiz_sessions import Bitset, QuizSession, MemorySessionStore
+from flaskr.pagination import CountCache, Paginator
+from models import setup_db, db, Question, Category
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,29 +16,354 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        self.database_path = os.environ.get(
+            'TRIVIA_TEST_DATABASE_URI', "postgres://{}/{}".format('localhost:5432', self.database_name))
+        self.app = create_app({'database_path': self.database_path})
+        self.client = self.app.test_client
 
         # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        paginator.invalidate()
+        sampler.invalidate()
+        category_cache.invalidate()
+        search_index.invalidate()
+        self.seed()
+
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def seed(self):
+        self.categories = [ Category(type) for type in ('Science', 'Art', 'Geography', 'History') ]
+        db.session.add_all(self.categories)
+        db.session.flush()
+        science, art = self.categories[0].id, self.categories[1].id
+        # 25 questions: science for the odd numbers, art for the even ones.
+        db.session.add_all([
+            Question('Question %02d?' % number, 'Answer %d' % number,
+                     str(science if number % 2 else art), number % 5 + 1)
+            for number in range(1, 26) ])
+        db.session.commit()
+
+    def get_json(self, path):
+        res = self.client().get(path)
+        return res, json.loads(res.data)
+
+    def post_json(self, path, body):
+        res = self.client().post(path, json=body)
+        return res, json.loads(res.data)
+
+    def question_ids(self, category=None):
+        query = Question.query
+        if category is not None:
+            query = query.filter(Question.category == str(category))
+        return [ question.id for question in query.order_by(Question.id) ]
+
+    def test_get_categories(self):
+        res, data = self.get_json('/categories')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['categories'][str(self.categories[0].id)], 'Science')
+        self.assertEqual(len(data['categories']), 4)
+
+    def test_get_questions_paginated(self):
+        res, data = self.get_json('/questions?page=2')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([ q['question'] for q in data['questions'] ],
+                         [ 'Question %02d?' % number for number in range(11, 21) ])
+        self.assertEqual(data['total_questions'], 25)
+        self.assertEqual(data['categories'][str(self.categories[1].id)], 'Art')
+        self.assertIsNone(data['current_category'])
+
+        res, data = self.get_json('/questions?page=3')
+        self.assertEqual(len(data['questions']), 5)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_get_questions_beyond_last_page(self):
+        res, data = self.get_json('/questions?page=100')
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_cursor_follows_page_numbers(self):
+        numbered = [ self.get_json('/questions?page=%d' % page)[1]['questions'] for page in (1, 2, 3) ]
+
+        res, first = self.get_json('/questions')
+        cursor_pages = [first['questions']]
+        cursor = first['next_cursor']
+        while cursor:
+            data = self.get_json('/questions?cursor=%s' % cursor)[1]
+            cursor_pages.append(data['questions'])
+            cursor = data['next_cursor']
+
+        self.assertEqual(cursor_pages, numbered)
+
+    def test_invalid_cursor(self):
+        res, data = self.get_json('/questions?cursor=not-a-cursor')
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+
+    def test_deep_page_seeks_from_remembered_start(self):
+        self.get_json('/questions?page=2')
+        # Page 3 starts where page 2's extra row said it would.
+        pages, starts, expires = paginator._bookmarks['questions']
+        self.assertEqual(pages, [2, 3])
+
+        res, data = self.get_json('/questions?page=3')
+        self.assertEqual(data['questions'][0]['id'], starts[1])
+
+    def test_total_is_cached(self):
+        self.assertEqual(self.get_json('/questions')[1]['total_questions'], 25)
+        Question('Question 26?', 'Answer 26', str(self.categories[0].id), 1).insert()
+        self.assertEqual(self.get_json('/questions')[1]['total_questions'], 26)
+
+        # Writes that bypass Question.insert() are not seen until the cache reloads.
+        db.session.add(Question('Question 27?', 'Answer 27', str(self.categories[0].id), 1))
+        db.session.commit()
+        self.assertEqual(self.get_json('/questions')[1]['total_questions'], 26)
+        category_cache.invalidate()
+        self.assertEqual(self.get_json('/questions')[1]['total_questions'], 27)
+
+    def test_count_cache_expires(self):
+        counts = CountCache(ttl=0)
+        query = Question.query
+
+        self.assertEqual(counts.get('questions', query), 25)
+        Question('Question 26?', 'Answer 26', str(self.categories[0].id), 1).insert()
+        self.assertEqual(counts.get('questions', query), 26)
+
+    def test_bookmarks_expire(self):
+        pages = Paginator(Question.id, count_ttl=0)
+        query = Question.query
+        self.assertEqual(pages.page(query, 'questions', 2).items[0].id, self.question_ids()[10])
+
+        # A delete this paginator was not told about (another process's).
+        db.session.delete(Question.query.get(self.question_ids()[0]))
+        db.session.commit()
+        self.assertEqual(pages.page(query, 'questions', 2).items[0].id, self.question_ids()[10])
+
+    def test_get_category_questions(self):
+        science = self.categories[0].id
+        res, data = self.get_json('/categories/%d/questions' % science)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['current_category'], 'Science')
+        self.assertEqual(data['total_questions'], 13)
+        self.assertEqual([ q['question'] for q in data['questions'] ],
+                         [ 'Question %02d?' % number for number in range(1, 20, 2) ])
+
+        data = self.get_json('/categories/%d/questions?cursor=%s' % (science, data['next_cursor']))[1]
+        self.assertEqual(len(data['questions']), 3)
+
+    def test_get_questions_of_missing_category(self):
+        res, data = self.get_json('/categories/1000/questions')
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+    def test_quiz_returns_an_unseen_question_of_the_category(self):
+        science = self.categories[0].id
+        ids = self.question_ids(science)
+        res, data = self.post_json('/quizzes', {
+            'quiz_category': {'type': 'Science', 'id': science}, 'previous_questions': ids[1:]})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['question']['id'], ids[0])
+
+    def test_quiz_over_all_categories_until_exhausted(self):
+        seen = []
+        while True:
+            data = self.post_json('/quizzes', {
+                'quiz_category': {'type': 'click', 'id': 0}, 'previous_questions': seen})[1]
+            if data['question'] is None:
+                break
+            self.assertNotIn(data['question']['id'], seen)
+            seen.append(data['question']['id'])
+
+        self.assertEqual(sorted(seen), self.question_ids())
+
+    def test_quiz_skips_questions_deleted_since_loading(self):
+        science = self.categories[0].id
+        ids = self.question_ids(science)
+        self.post_json('/quizzes', {'quiz_category': {'id': science}, 'previous_questions': []})
+        Question.query.get(ids[0]).delete()
+
+        data = self.post_json('/quizzes', {'quiz_category': {'id': science}, 'previous_questions': ids[1:]})[1]
+        self.assertIsNone(data['question'])
+
+    def test_quiz_errors(self):
+        self.assertEqual(self.client().post('/quizzes', data='nope').status_code, 400)
+        res, data = self.post_json('/quizzes', {'quiz_category': {'id': 'x'}, 'previous_questions': []})
+        self.assertEqual(res.status_code, 422)
+        res, data = self.post_json('/quizzes', {'quiz_category': {'id': 1000}, 'previous_questions': []})
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+    def test_quiz_session_replaces_previous_questions(self):
+        science = self.categories[0].id
+        res, data = self.post_json('/quizzes', {'quiz_category': {'id': science}, 'previous_questions': []})
+        token = data['quiz_session']
+        seen = [data['question']['id']]
+        while True:
+            data = self.post_json('/quizzes', {'quiz_session': token})[1]
+            if data['question'] is None:
+                break
+            self.assertEqual(data['quiz_session'], token)
+            self.assertNotIn(data['question']['id'], seen)
+            seen.append(data['question']['id'])
+
+        self.assertEqual(sorted(seen), self.question_ids(science))
+        self.assertIsNone(data['quiz_session'])
+        # A finished game's session is gone.
+        self.assertEqual(self.client().post('/quizzes', json={'quiz_session': token}).status_code, 404)
+
+    def test_quiz_session_expires(self):
+        store = MemorySessionStore(ttl=0)
+        session = QuizSession(1, [5])
+        store.put(session)
+        self.assertIsNone(store.get(session.token))
+
+        store = MemorySessionStore(max_sessions=2)
+        sessions = [ QuizSession(ALL) for _ in range(3) ]
+        for session in sessions:
+            store.put(session)
+        self.assertIsNone(store.get(sessions[0].token))
+        self.assertIs(store.get(sessions[2].token), sessions[2])
+        self.assertEqual(len(store), 2)
+
+    def test_bitset(self):
+        bits = Bitset([3, 64, 1000000, 3])
+        self.assertEqual(len(bits), 3)
+        self.assertIn(64, bits)
+        self.assertNotIn(65, bits)
+        self.assertEqual(list(bits), [3, 64, 1000000])
+
+        session = QuizSession.loads('token', QuizSession(2, bits).dumps())
+        self.assertEqual((session.category, list(session.seen)), (2, [3, 64, 1000000]))
+        self.assertRaises(ValueError, bits.add, -1)
+
+    def test_categories_are_served_from_cache(self):
+        science = str(self.categories[0].id)
+        res, data = self.get_json('/categories')
+        self.assertEqual(data['question_counts'][science], 13)
+        self.assertEqual(res.headers['Cache-Control'], 'no-cache')
+
+        statements = []
+        record = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            again = self.client().get('/categories', headers={'If-None-Match': res.headers['ETag']})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(statements, [])
+
+        Question('Question 26?', 'Answer 26', science, 1).insert()
+        res, data = self.get_json('/categories')
+        self.assertEqual(data['question_counts'][science], 14)
+        self.assertNotEqual(res.headers['ETag'], again.headers['ETag'])
+
+    def test_delete_question(self):
+        question_id = self.question_ids()[0]
+        res = self.client().delete('/questions/%d' % question_id)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((data['deleted'], data['total_questions']), (question_id, 24))
+        self.assertIsNone(Question.query.get(question_id))
+        self.assertEqual(self.get_json('/questions')[1]['questions'][0]['id'], self.question_ids()[0])
+        self.assertEqual(self.client().delete('/questions/%d' % question_id).status_code, 404)
+
+    def test_create_question(self):
+        art = self.categories[1].id
+        res, data = self.post_json('/questions', {
+            'question': 'La Giaconda is better known as what?', 'answer': 'Mona Lisa',
+            'category': str(art), 'difficulty': '3'})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['total_questions'], 26)
+        self.assertEqual(Question.query.get(data['created']).answer, 'Mona Lisa')
+        category = self.get_json('/categories/%d/questions?page=2' % art)[1]
+        self.assertEqual(category['questions'][-1]['id'], data['created'])
+        self.assertEqual(category['total_questions'], 13)
+
+    def test_create_question_validation(self):
+        body = {'question': 'Who?', 'answer': 'Me', 'category': self.categories[0].id, 'difficulty': 1}
+        for change in ({'question': ' '}, {'answer': None}, {'category': 1000}, {'difficulty': 9}, {'difficulty': 'x'}):
+            res, data = self.post_json('/questions', dict(body, **change))
+            self.assertEqual(res.status_code, 422, change)
+            self.assertFalse(data['success'])
+
+    def test_search_questions(self):
+        res, data = self.post_json('/questions', {'searchTerm': 'question 1'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        # 'Question 1x?' for 10 to 19; none of them is closer than another.
+        self.assertEqual([ q['question'] for q in data['questions'] ],
+                         [ 'Question %02d?' % number for number in range(10, 20) ])
+        self.assertEqual((data['total_questions'], data['has_more']), (10, False))
+        self.assertIsNone(data['current_category'])
+
+        self.assertEqual(self.post_json('/questions', {'searchTerm': 'nothing like it'})[1]['questions'], [])
+
+    def test_search_ranks_closest_match_first(self):
+        art = str(self.categories[1].id)
+        Question('Which painter cut off his ear?', 'Van Gogh', art, 2).insert()
+        Question('Painter', 'Anyone', art, 1).insert()
+
+        data = self.post_json('/questions', {'searchTerm': 'painter'})[1]
+        self.assertEqual([ q['question'] for q in data['questions'] ], ['Painter', 'Which painter cut off his ear?'])
+
+    def test_search_pages_by_cursor(self):
+        data = self.post_json('/questions', {'searchTerm': 'QUESTION'})[1]
+        pages = [data['questions']]
+        while data['next_cursor']:
+            data = self.post_json('/questions', {'searchTerm': 'question', 'cursor': data['next_cursor']})[1]
+            pages.append(data['questions'])
+
+        self.assertEqual([ len(page) for page in pages ], [10, 10, 5])
+        self.assertEqual([ q['question'] for page in pages for q in page ],
+                         [ 'Question %02d?' % number for number in range(1, 26) ])
+        self.assertEqual(self.post_json('/questions', {'searchTerm': 'question', 'page': 4})[0].status_code, 404)
+        self.assertEqual(self.post_json('/questions', {'searchTerm': 'question', 'cursor': 'nope'})[0].status_code, 400)
+
+    def test_search_pages_and_follows_writes(self):
+        data = self.post_json('/questions', {'searchTerm': 'Question', 'page': 3})[1]
+        self.assertEqual((len(data['questions']), data['total_questions']), (5, 25))
+
+        Question('100% of the questions?', 'All', str(self.categories[0].id), 1).insert()
+        first, second = self.question_ids()[:2]
+        question = Question.query.get(first)
+        question.question = 'Renamed'
+        question.update()
+        Question.query.get(second).delete()
+
+        data = self.post_json('/questions?page=3', {'searchTerm': 'question'})[1]
+        self.assertEqual(data['total_questions'], 24)
+        # % is matched literally, not as a wildcard.
+        data = self.post_json('/questions', {'searchTerm': '0%'})[1]
+        self.assertEqual([ q['answer'] for q in data['questions'] ], ['All'])
+        self.assertEqual(self.post_json('/questions', {'searchTerm': 'renamed'})[1]['total_questions'], 1)
 
-    """
-    TODO
-    Write at least one test for each test for successful operation and for expected errors.
-    """
+    def test_search_validation(self):
+        for body in ({'searchTerm': ' '}, {'searchTerm': 3}, {'searchTerm': 'q', 'page': 0}, {'searchTerm': 'q', 'page': 'x'}):
+            res, data = self.post_json('/questions', body)
+            self.assertEqual(res.status_code, 422, body)
+            self.assertFalse(data['success'])
 
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
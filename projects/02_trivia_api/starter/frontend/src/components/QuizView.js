@@ -11,6 +11,7 @@ class QuizView extends Component {
     this.state = {
         quizCategory: null,
         previousQuestions: [],
+        quizSession: null,
         showAnswer: false,
         categories: {},
         numCorrect: 0,
@@ -45,12 +46,20 @@ class QuizView extends Component {
     const previousQuestions = [...this.state.previousQuestions]
     if(this.state.currentQuestion.id) { previousQuestions.push(this.state.currentQuestion.id) }
 
+    // Once the server has issued a session it remembers the category and
+    // the questions asked, so only the token is sent.
+    this.requestQuestion(previousQuestions, this.state.quizSession)
+  }
+
+  requestQuestion = (previousQuestions, quizSession) => {
     $.ajax({
       url: '/quizzes', //TODO: update request URL
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
-      data: JSON.stringify({
+      data: JSON.stringify(quizSession ? {
+        quiz_session: quizSession
+      } : {
         previous_questions: previousQuestions,
         quiz_category: this.state.quizCategory
       }),
@@ -62,12 +71,20 @@ class QuizView extends Component {
         this.setState({
           showAnswer: false,
           previousQuestions: previousQuestions,
+          quizSession: result.quiz_session,
           currentQuestion: result.question,
           guess: '',
           forceEnd: result.question ? false : true
         })
       },
       error: (error) => {
+        // The session expired or the server forgot it (a restart): carry on
+        // from the questions this page has kept, which starts a new one.
+        if(quizSession && error.status === 404) {
+          this.setState({quizSession: null})
+          this.requestQuestion(previousQuestions, null)
+          return
+        }
         alert('Unable to load question. Please try your request again')
       }
     })
@@ -87,6 +104,7 @@ class QuizView extends Component {
     this.setState({
       quizCategory: null,
       previousQuestions: [],
+      quizSession: null,
       showAnswer: false,
       numCorrect: 0,
       currentQuestion: {},